@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+# End to end benchmark of the driver against simulated meters on a private session bus, for
+# example to compare two versions:
+#   ./benchmark.py --duration 60 --meter 1:sdm120 --meter 2:sdm630 --output before.json
+# Reports poll cycle and publish latency percentiles, bytes on the wire, D-Bus signals per second
+# and CPU time per cycle as JSON. Needs dbus-daemon, the simulator runs in the same process but
+# its CPU time is not counted. With --crc, only compares the CRC-16 implementations.
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import subprocess
+import configparser
+
+def start_bus():
+    # Private session bus, the services connect to it through DBUS_SESSION_BUS_ADDRESS
+    daemon = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address=1'],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    os.environ['DBUS_SESSION_BUS_ADDRESS'] = daemon.stdout.readline().strip()
+    return daemon
+
+def percentiles(values, scale=1000.0):
+    # In ms by default
+    if not values:
+        return None
+    values = sorted(values)
+    def _percentile(q): return values[min(int(q * len(values)), len(values) - 1)] * scale
+    return {
+        'n': len(values),
+        'mean': sum(values) / len(values) * scale,
+        'p50': _percentile(0.50),
+        'p90': _percentile(0.90),
+        'p99': _percentile(0.99),
+        'max': values[-1] * scale,
+    }
+
+def version():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.realpath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        return None
+
+def _crc_reference(inputbytes):
+    # The byte at a time CRC-16 that minimalmodbus used before
+    import minimalmodbus
+    register = 0xFFFF
+    for current_byte in inputbytes:
+        register = (register >> 8) ^ minimalmodbus._CRC16TABLE[(register ^ current_byte) & 0xFF]
+    return minimalmodbus._num_to_two_bytes(register, lsb_first=True)
+
+def crc(args):
+    sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'ext'))
+    import minimalmodbus
+    import transport
+
+    # A poll request and the response of a full SDM630 block
+    request = b'\x01\x04\x00\x0c\x00\x2a'
+    response = bytes(3 + 84)
+    response += minimalmodbus._calculate_crc(response)
+
+    def _us(function): return timeit.timeit(function, number=args.repeat) / args.repeat * 1e6
+    return {
+        'version': version(),
+        'python': platform.python_version(),
+        'request_reference_us': _us(lambda: request + _crc_reference(request)),
+        'request_us': _us(lambda: request + minimalmodbus._calculate_crc(request)),
+        'request_cached_us': _us(lambda: transport.request_frame(1, 4, 0x000C, 42)),
+        'response_reference_us': _us(lambda: _crc_reference(response[:-2]) == response[-2:]),
+        'response_us': _us(lambda: minimalmodbus._calculate_crc(response[:-2]) == response[-2:]),
+        'response_residue_us': _us(lambda: minimalmodbus._crc16(response) == 0),
+    }
+
+def run(args):
+    from gi.repository import GLib
+    from dbus.mainloop.glib import DBusGMainLoop
+    import dbus
+
+    import sdm120pv
+    import simulator
+    from poller import AdaptiveInterval, Poller
+
+    DBusGMainLoop(set_as_default=True)
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config.ini'))
+    paths = sdm120pv.dbus_paths(config)
+    intervals = {'fast': args.interval_fast / 1000.0, 'normal': args.interval_normal / 1000.0, 'slow': args.interval_slow / 1000.0}
+
+    meters = [meter.split(':') for meter in args.meter or ['1:sdm120']]
+    bench = simulator.Simulator(
+        [simulator.SimulatedMeter(int(slave), device_type) for slave, device_type in meters],
+        args.latency / 1000.0, args.jitter / 1000.0, args.crc_error, args.drop, args.baudrate, args.seed)
+    bench.start()
+
+    services = []
+    for n, (slave, device_type) in enumerate(meters):
+        services.append(sdm120pv.DbusSdm120PvService(
+            deviceinstance = 200 + n,
+            paths = dict(paths),
+            serial_port = bench.port,
+            slave = int(slave),
+            device_type = device_type,
+            productname = 'Benchmark',
+            intervals = intervals,
+            publish_interval = args.publish_interval / 1000.0
+        ))
+
+    # Signals as seen by a client of the services
+    signals = [0]
+    def _signal(*values): signals[0] += 1
+    monitor = dbus.bus.BusConnection(os.environ['DBUS_SESSION_BUS_ADDRESS'])
+    monitor.add_signal_receiver(_signal, dbus_interface='com.victronenergy.BusItem')
+
+    poller = Poller(
+        [service.meter for service in services],
+        AdaptiveInterval(args.interval / 1000.0, args.interval_min / 1000.0, args.interval_max / 1000.0))
+
+    # Time from the start of a poll cycle until its last response
+    cycles = []
+    cycle_done = poller._cycle_done
+    def _cycle_done():
+        cycles.append(poller._loop.time() - poller._cycle_started)
+        cycle_done()
+    poller._cycle_done = _cycle_done
+
+    # Time from the end of a poll until published on D-Bus, and the CPU time of the publication
+    publish = []
+    publish_cpu = []
+    def _instrument(service):
+        update = service._update
+        def _update():
+            sample = service.meter.latest
+            started = time.thread_time()
+            result = update()
+            if sample is not None:
+                publish.append(time.time() - sample.timestamp)
+                publish_cpu.append(time.thread_time() - started)
+            return result
+        service._update = _update
+    for service in services:
+        _instrument(service)
+
+    mainloop = GLib.MainLoop()
+    GLib.timeout_add(int(args.warmup * 1000), mainloop.quit)
+    poller.start()
+    mainloop.run()
+
+    # Measure from here, after the first (complete) cycles
+    del cycles[:], publish[:], publish_cpu[:]
+    signals[0] = 0
+    received, sent, requests = bench.received, bench.sent, bench.requests
+    cpu = time.process_time() - bench.cpu
+    started = time.monotonic()
+
+    GLib.timeout_add(int(args.duration * 1000), mainloop.quit)
+    mainloop.run()
+
+    duration = time.monotonic() - started
+    cpu = time.process_time() - bench.cpu - cpu
+    poller.stop()
+    bench.stop()
+
+    # Cost of the text formatting and item snapshots requested by clients such as the GUI
+    root = services[0]._dbusservice._dbusnodes['/']
+    items = list(services[0]._dbusservice._dbusobjects.values())
+    gettext = timeit.timeit(lambda: [item.GetText() for item in items], number=args.repeat) / args.repeat
+    roottext = timeit.timeit(root.GetText, number=args.repeat) / args.repeat
+    getitems = timeit.timeit(root.GetItems, number=args.repeat) / args.repeat
+
+    wire = (bench.received - received) + (bench.sent - sent)
+    return {
+        'version': version(),
+        'python': platform.python_version(),
+        'args': vars(args),
+        'duration': duration,
+        'cycles': len(cycles),
+        'cycle_ms': percentiles(cycles),
+        'publish_ms': percentiles(publish),
+        'publish_cpu_ms': percentiles(publish_cpu),
+        'interval_ms': poller.interval.interval * 1000,
+        'requests_per_s': (bench.requests - requests) / duration,
+        'wire_bytes_per_s': wire / duration,
+        'wire_bytes_per_cycle': wire / len(cycles) if cycles else None,
+        'dbus_signals_per_s': signals[0] / duration,
+        'cpu_percent': 100 * cpu / duration,
+        'cpu_ms_per_cycle': 1000 * cpu / len(cycles) if cycles else None,
+        'gettext_items_us': gettext * 1e6,
+        'gettext_root_us': roottext * 1e6,
+        'getitems_us': getitems * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='End to end benchmark of the driver against simulated meters')
+    parser.add_argument('--meter', action='append', default=[], metavar='SLAVE:TYPE',
+        help='slave address and device type, for example 1:sdm120 (default), may be repeated')
+    parser.add_argument('--duration', type=float, default=30, help='measurement time (in s)')
+    parser.add_argument('--warmup', type=float, default=5, help='time before measuring (in s)')
+    parser.add_argument('--interval', type=int, default=1000, help='initial poll interval (in ms)')
+    parser.add_argument('--interval-min', type=int, default=250)
+    parser.add_argument('--interval-max', type=int, default=5000)
+    parser.add_argument('--interval-fast', type=int, default=250)
+    parser.add_argument('--interval-normal', type=int, default=1000)
+    parser.add_argument('--interval-slow', type=int, default=30000)
+    parser.add_argument('--publish-interval', type=int, default=0, help='minimum time between publications (in ms)')
+    parser.add_argument('--latency', type=float, default=10, help='turnaround time of the meters (in ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='random extra turnaround time up to (in ms)')
+    parser.add_argument('--crc-error', type=float, default=0, help='probability of a corrupted response')
+    parser.add_argument('--drop', type=float, default=0, help='probability of a missing response')
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--seed', type=int, default=1, help='seed for reproducible faults')
+    parser.add_argument('--repeat', type=int, default=1000, help='repetitions of the GetText, GetItems and CRC timings')
+    parser.add_argument('--output', help='write the results to this file instead of stdout')
+    parser.add_argument('--crc', action='store_true', help='only time the CRC-16 calculations')
+    args = parser.parse_args()
+
+    if args.crc:
+        results = crc(args)
+    else:
+        daemon = start_bus()
+        try:
+            results = run(args)
+        finally:
+            daemon.terminate()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import zlib
+import logging
+
+# Energy counters of the meters, checkpointed in the log (kWh)
+COUNTERS = ('import', 'export', 'total')
+
+# The log is rewritten with only its newest checkpoints when it grows beyond this size
+MAX_SIZE = 256 * 1024
+KEEP = 100
+
+class EnergyLog(object):
+    # Append-only log of checkpoints of the energy counters of one meter. The published counters
+    # are the raw counters of the meter plus an offset per counter. When a counter of the meter
+    # decreases or jumps more than max_power allows (counter reset or another meter), the offset
+    # is changed so the published counter continues from the last checkpoint.
+    #
+    # A line is "<time> <raw> <offset> <raw> <offset> ... <crc32>" with a raw and an offset per
+    # counter. Torn or corrupt lines (power loss during a write) fail the CRC and are skipped.
+    # To spare the flash, a checkpoint is written when a counter changed by delta kWh, at most
+    # every interval s, and the file is synced once per write.
+    def __init__(self, filename, max_power, offsets={}, interval=900, delta=0.1):
+        self._filename = filename
+        self._max_rate = 2.0 * max_power / 3600 / 1000  # kWh/s, with a margin
+        self._interval = interval
+        self._delta = delta
+        self._time = None
+        self._raw = None
+        self._offsets = dict((counter, offsets.get(counter, 0.0)) for counter in COUNTERS)
+        self._written = None
+        self._torn = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self._filename, 'rb') as file:
+                for line in file:
+                    # A line without newline at the end was torn, the next write starts a new line
+                    self._torn = not line.endswith(b'\n')
+                    checkpoint = self._parse(line)
+                    if checkpoint is None:
+                        logging.warning("Skipped corrupt checkpoint in %s" % self._filename)
+                        continue
+                    self._time, self._raw, self._offsets = checkpoint
+        except FileNotFoundError:
+            return
+        if self._raw is not None:
+            self._written = dict(self._raw, time=self._time)
+        logging.info("Energy counters from %s: %s" % (self._filename, self._raw))
+
+    @staticmethod
+    def _parse(line):
+        try:
+            fields = line.split()
+            if len(fields) != 2 + 2 * len(COUNTERS):
+                return None
+            if int(fields[-1], 16) != zlib.crc32(b' '.join(fields[:-1])):
+                return None
+            numbers = [float(field) for field in fields[:-1]]
+        except ValueError:
+            return None
+        raw = dict(zip(COUNTERS, numbers[1::2]))
+        offsets = dict(zip(COUNTERS, numbers[2::2]))
+        return numbers[0], raw, offsets
+
+    def _format(self):
+        fields = ['%.3f' % self._time]
+        for counter in COUNTERS:
+            fields += ['%.3f' % self._raw[counter], '%.3f' % self._offsets[counter]]
+        line = ' '.join(fields).encode()
+        return line + b' %08x\n' % zlib.crc32(line)
+
+    def update(self, timestamp, values):
+        # Returns values with the continued counters, writes a checkpoint when due
+        raw = dict((counter, values[counter]) for counter in COUNTERS if values.get(counter) is not None)
+        if len(raw) != len(COUNTERS):
+            # Without all counters a reset cannot be detected, so none of them is published
+            return dict((name, value) for name, value in values.items() if name not in COUNTERS)
+
+        discontinuity = False
+        if self._raw is not None:
+            allowed = self._max_rate * max(timestamp - self._time, 0) + self._delta
+            for counter in COUNTERS:
+                change = raw[counter] - self._raw[counter]
+                if change < -self._delta or change > allowed:
+                    # Continue from the last known counter
+                    offset = self._raw[counter] + self._offsets[counter] - raw[counter]
+                    logging.warning("Energy counter %s changed from %.3f to %.3f kWh, offset %.3f kWh" % (
+                        counter, self._raw[counter], raw[counter], offset))
+                    self._offsets[counter] = offset
+                    discontinuity = True
+
+        self._time = timestamp
+        self._raw = raw
+
+        if discontinuity or self._due(timestamp):
+            self._write()
+
+        values = dict(values)
+        for counter in COUNTERS:
+            values[counter] = raw[counter] + self._offsets[counter]
+        return values
+
+    def _due(self, timestamp):
+        if self._written is None:
+            return True
+        if timestamp - self._written['time'] < self._interval:
+            return False
+        return any(abs(self._raw[counter] - self._written[counter]) >= self._delta for counter in COUNTERS)
+
+    def _write(self):
+        try:
+            fd = os.open(self._filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (b'\n' if self._torn else b'') + self._format())
+                self._torn = False
+                os.fsync(fd)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size > MAX_SIZE:
+                self._compact()
+        except OSError as e:
+            logging.error("Writing %s failed: %r" % (self._filename, e))
+            return
+        self._written = dict(self._raw, time=self._time)
+
+    def _compact(self):
+        # Keep the newest checkpoints, replacing the file atomically
+        with open(self._filename, 'rb') as file:
+            lines = [line for line in file if self._parse(line) is not None][-KEEP:]
+        temporary = self._filename + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.writelines(lines)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._filename)
+        directory = os.open(os.path.dirname(os.path.abspath(self._filename)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
@@ -28,8 +28,10 @@ if sys.version_info < (3, 8, 0):
         "Your Python version is too old for this version of MinimalModbus"
     )
 
+import array
 import binascii
 import enum
+import functools
 import os
 import struct
 import time
@@ -56,6 +58,8 @@ _BYTEPOSITION_FOR_FUNCTIONCODE = 1  # Relative to (stripped) response
 _BYTEPOSITION_FOR_SLAVE_ERROR_CODE = 2  # Relative to (stripped) response
 _BITNUMBER_FUNCTIONCODE_ERRORINDICATION = 7
 _SLAVEADDRESS_BROADCAST = 0
+_NUMBER_OF_RTU_RESPONSE_STARTBYTES = 2  # Slave address and function code
+_MAX_RTU_FRAME_SIZE = 256
 
 # Several instrument instances can share the same serialport
 _serialports: Dict[str, serial.Serial] = {}  # Key: port name, value: port instance
@@ -96,6 +100,64 @@ class _Payloadformat(enum.Enum):
 # ######################## #
 
 
+class PollRequest:
+    """Prebuilt read of 16-bit registers, see :meth:`Instrument.add_poll`.
+
+    The arguments are checked once, and the RTU request frame and the size of
+    the response are kept for the life of the request.
+
+    Args:
+        * name: Name of the request, or None.
+        * slaveaddress: Slave address the frame is built for.
+        * functioncode: Modbus function code. Can be 3 or 4.
+        * registeraddress: The slave register start address.
+        * number_of_registers: The number of registers to read, max 125 registers.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str],
+        slaveaddress: int,
+        functioncode: int,
+        registeraddress: int,
+        number_of_registers: int,
+    ) -> None:
+        _check_slaveaddress(slaveaddress)
+        _check_functioncode(functioncode, [3, 4])
+        _check_registeraddress(registeraddress)
+        _check_int(
+            number_of_registers,
+            minvalue=1,
+            maxvalue=_MAX_NUMBER_OF_REGISTERS_TO_READ,
+            description="number of registers",
+        )
+        self.name = name
+        self.slaveaddress = slaveaddress
+        self.functioncode = functioncode
+        self.registeraddress = registeraddress
+        self.number_of_registers = number_of_registers
+        self.number_of_bytes = _NUMBER_OF_BYTES_PER_REGISTER * number_of_registers
+        self.payload = _num_to_two_bytes(registeraddress) + _num_to_two_bytes(
+            number_of_registers
+        )
+        self.request = _embed_payload(slaveaddress, MODE_RTU, functioncode, self.payload)
+        self.response_size = _predict_response_size(
+            MODE_RTU, functioncode, self.payload
+        )
+
+    def __repr__(self) -> str:
+        """Give string representation of the :class:`.PollRequest` object."""
+        return "{}.{}<name={!r}, address={}, functioncode={}, register={}+{}>".format(
+            self.__module__,
+            self.__class__.__name__,
+            self.name,
+            self.slaveaddress,
+            self.functioncode,
+            self.registeraddress,
+            self.number_of_registers,
+        )
+
+
 class Instrument:
     """Instrument class for talking to instruments (slaves).
 
@@ -250,6 +312,15 @@ class Instrument:
 
         self._latest_roundtrip_time: Optional[float] = None
 
+        self.polls: Dict[str, PollRequest] = {}
+        """The requests registered with :meth:`add_poll`, by name."""
+
+        # For poll: the receive buffer, and the requests of read_registers_into
+        # that were checked and built before
+        self._receive_buffer = bytearray(_MAX_RTU_FRAME_SIZE)
+        self._receive_view = memoryview(self._receive_buffer)
+        self._trusted_requests: Dict[Any, PollRequest] = {}
+
     def __repr__(self) -> str:
         """Give string representation of the :class:`.Instrument` object."""
         template = (
@@ -934,6 +1005,172 @@ class Instrument:
         assert isinstance(returnvalue, list)
         return [int(x) for x in returnvalue]
 
+    def read_registers_into(
+        self, registeraddress: int, number_of_registers: int, functioncode: int = 3
+    ) -> memoryview:
+        """Read 16-bit registers in the slave into the receive buffer.
+
+        This is a fast path for requests that are issued over and over, for
+        example when polling. The arguments are checked and the request is
+        built the first time only, as with :meth:`add_poll`. The response is
+        read into a receive buffer that is allocated once per instrument, and
+        verified in place.
+
+        Args:
+            * registeraddress: The slave register start address.
+            * number_of_registers: The number of registers to read, max 125 registers.
+            * functioncode: Modbus function code. Can be 3 or 4.
+
+        Returns:
+            A read-only view of the raw register data (big-endian, two bytes per
+            register) in the receive buffer. It is only valid until the next
+            read into the buffer, decode it for example with
+            :meth:`struct.Struct.unpack_from`.
+
+        Raises:
+            TypeError, ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+        """
+        key = (self.address, functioncode, registeraddress, number_of_registers)
+        pollrequest = self._trusted_requests.get(key)
+        if pollrequest is None:
+            pollrequest = self._trusted_requests[key] = PollRequest(
+                None, self.address, functioncode, registeraddress, number_of_registers
+            )
+        return self.poll(pollrequest)
+
+    def add_poll(
+        self,
+        name: str,
+        registeraddress: int,
+        number_of_registers: int,
+        functioncode: int = 3,
+    ) -> "PollRequest":
+        """Register a named read of 16-bit registers, for :meth:`poll`.
+
+        The request frame and the expected response size are built once and
+        reused for every :meth:`poll`, so a poll costs little more than its
+        time on the wire.
+
+        Args:
+            * name: Name of the request, to poll it by name.
+            * registeraddress: The slave register start address.
+            * number_of_registers: The number of registers to read, max 125 registers.
+            * functioncode: Modbus function code. Can be 3 or 4.
+
+        Returns:
+            The handle of the request, to poll it without looking up its name.
+
+        Raises:
+            TypeError, ValueError
+        """
+        _check_string(name, description="poll name", minlength=1)
+        pollrequest = PollRequest(
+            name, self.address, functioncode, registeraddress, number_of_registers
+        )
+        self.polls[name] = pollrequest
+        return pollrequest
+
+    def poll(self, handle: Union[str, "PollRequest"]) -> memoryview:
+        """Execute a request registered with :meth:`add_poll`.
+
+        Args:
+            * handle: The handle returned by :meth:`add_poll`, or its name.
+
+        Returns:
+            A read-only view of the raw register data in the receive buffer,
+            see :meth:`read_registers_into`.
+
+        Raises:
+            TypeError, ValueError, ModbusException,
+            serial.SerialException (inherited from IOError)
+
+        Falls back to the regular path in ASCII mode, for broadcasts, with local
+        echo handling, when closing the port after each call and in debug mode.
+        """
+        if isinstance(handle, str):
+            if handle not in self.polls:
+                raise ValueError("No poll named {!r}".format(handle))
+            handle = self.polls[handle]
+        if handle.slaveaddress != self.address:
+            raise ValueError(
+                "The poll {!r} was built for slave address {}, not {}".format(
+                    handle.name, handle.slaveaddress, self.address
+                )
+            )
+
+        functioncode = handle.functioncode
+        number_of_bytes = handle.number_of_bytes
+        first_databyte = (
+            _NUMBER_OF_RTU_RESPONSE_STARTBYTES + _NUMBER_OF_BYTES_BEFORE_REGISTERDATA
+        )
+
+        if (
+            self.mode != MODE_RTU
+            or self.address == _SLAVEADDRESS_BROADCAST
+            or self.handle_local_echo
+            or self.close_port_after_each_call
+            or self.debug
+        ):
+            payload_from_slave = self._perform_command(functioncode, handle.payload)
+            _check_response_payload(
+                payload_from_slave,
+                functioncode,
+                handle.registeraddress,
+                None,
+                0,
+                handle.number_of_registers,
+                0,
+                False,
+                BYTEORDER_BIG,
+                _Payloadformat.REGISTERS,
+            )
+            self._receive_buffer[first_databyte : first_databyte + number_of_bytes] = (
+                payload_from_slave[_NUMBER_OF_BYTES_BEFORE_REGISTERDATA:]
+            )
+            return self._receive_view[
+                first_databyte : first_databyte + number_of_bytes
+            ].toreadonly()
+
+        received = self._communicate_into(handle.request, handle.response_size)
+        response = self._receive_view[:received]
+        buffer = self._receive_buffer
+
+        if _crc16(response) != 0:
+            raise InvalidResponseError(
+                "Checksum error in rtu mode. The response is: {!r}".format(
+                    bytes(response)
+                )
+            )
+        if buffer[_BYTEPOSITION_FOR_SLAVEADDRESS] != self.address:
+            raise InvalidResponseError(
+                "Wrong return slave address: {} instead of {}.".format(
+                    buffer[_BYTEPOSITION_FOR_SLAVEADDRESS], self.address
+                )
+            )
+        if _check_bit(
+            buffer[_BYTEPOSITION_FOR_FUNCTIONCODE],
+            _BITNUMBER_FUNCTIONCODE_ERRORINDICATION,
+        ):
+            _check_response_slaveerrorcode(bytes(response))
+        if (
+            received != handle.response_size
+            or buffer[_BYTEPOSITION_FOR_FUNCTIONCODE] != functioncode
+            or buffer[_NUMBER_OF_RTU_RESPONSE_STARTBYTES] != number_of_bytes
+        ):
+            raise InvalidResponseError(
+                "Wrong response for reading {} registers at {} with function code {}: "
+                "{!r}".format(
+                    handle.number_of_registers,
+                    handle.registeraddress,
+                    functioncode,
+                    bytes(response),
+                )
+            )
+        return self._receive_view[
+            first_databyte : first_databyte + number_of_bytes
+        ].toreadonly()
+
     def write_registers(self, registeraddress: int, values: List[int]) -> None:
         """Write integers to 16-bit registers in the slave.
 
@@ -1528,6 +1765,51 @@ class Instrument:
 
         return answer
 
+    def _communicate_into(self, request: bytes, number_of_bytes_to_read: int) -> int:
+        """Talk to the slave, reading the response into the receive buffer.
+
+        Like :meth:`_communicate`, without the checks of the arguments and the
+        debug output, for :meth:`poll`.
+
+        Returns:
+            The number of bytes received.
+
+        Raises:
+            NoResponseError, serial.SerialException (inherited from IOError)
+        """
+        serial_port = self.serial
+        if serial_port is None:
+            raise ModbusException("The serial port instance is None")
+        if not serial_port.is_open:
+            serial_port.open()
+
+        portname: str = serial_port.port or ""
+
+        if self.clear_buffers_before_each_transaction:
+            serial_port.reset_input_buffer()
+            serial_port.reset_output_buffer()
+
+        # Sleep to make sure 3.5 character times have passed
+        sleep_time = (
+            _latest_read_times.get(portname, 0)
+            + _calculate_minimum_silent_period(serial_port.baudrate)
+            - time.monotonic()
+        )
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+
+        write_time = time.monotonic()
+        serial_port.write(request)
+        received = serial_port.readinto(self._receive_view[:number_of_bytes_to_read])
+
+        read_time = time.monotonic()
+        _latest_read_times[portname] = read_time
+        self._latest_roundtrip_time = read_time - write_time
+
+        if not received:
+            raise NoResponseError("No communication with the instrument (no answer)")
+        return received
+
 
 # ########## #
 # Exceptions #
@@ -1781,7 +2063,7 @@ def _embed_payload(
             + _ASCII_FOOTER
         )
     else:
-        request = first_part + _calculate_crc(first_part)
+        request = first_part + _calculate_request_crc(first_part)
 
     return request
 
@@ -1891,7 +2173,12 @@ def _extract_payload(
 
     received_checksum = response[-number_of_checksum_bytes:]
     response_without_checksum = response[0 : (len(response) - number_of_checksum_bytes)]
-    calculated_checksum = calculate_checksum(response_without_checksum)
+
+    # The CRC over a whole RTU frame is 0 when its CRC is correct
+    if mode == MODE_ASCII or _crc16(response) != 0:
+        calculated_checksum = calculate_checksum(response_without_checksum)
+    else:
+        calculated_checksum = received_checksum
 
     if received_checksum != calculated_checksum:
         template = (
@@ -3293,6 +3580,22 @@ Built with this code::
     print output
 """
 
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+_CRC16WORDTABLE = array.array(
+    "H",
+    (
+        _CRC16TABLE[((index >> 8) ^ _CRC16TABLE[index & 0xFF]) & 0xFF]
+        ^ (((index >> 8) ^ _CRC16TABLE[index & 0xFF]) >> 8)
+        for index in range(65536)
+    ),
+)
+"""CRC-16 lookup table with 65536 elements, for two bytes at a time.
+
+Element i is the CRC register after shifting in two zero bytes, starting
+from register value i. It is the 256 element table applied twice.
+"""
+
 
 def _is_serial_object(obj: Any) -> bool:
     """Check if an object is serialport-like."""
@@ -3315,13 +3618,57 @@ def _calculate_crc(inputbytes: bytes) -> bytes:
     """
     _check_bytes(inputbytes, description="CRC input bytes")
 
+    return _crc16(inputbytes).to_bytes(2, "little")
+
+
+def _crc16(inputbytes: Union[bytes, bytearray, memoryview]) -> int:
+    """Calculate the CRC-16 register for Modbus RTU, without checking the input.
+
+    On little-endian machines the message is processed two bytes at a time,
+    with a 16-bit view on the message and the 65536 element table.
+
+    Args:
+        inputbytes: An arbitrary-length message.
+
+    Returns:
+        The CRC register. It is 0 for a message that ends with its own valid
+        CRC, which is how responses are verified without slicing off the CRC.
+    """
     # Preload a 16-bit register with ones
     register = 0xFFFF
 
+    if _LITTLE_ENDIAN:
+        length = len(inputbytes)
+        table = _CRC16WORDTABLE
+        for word in memoryview(inputbytes)[: length & ~1].cast("H"):
+            register = table[register ^ word]
+        if length & 1:
+            register = (register >> 8) ^ _CRC16TABLE[
+                (register ^ inputbytes[length - 1]) & 0xFF
+            ]
+        return register
+
+    table = _CRC16TABLE
     for current_byte in inputbytes:
-        register = (register >> 8) ^ _CRC16TABLE[(register ^ current_byte) & 0xFF]
+        register = (register >> 8) ^ table[(register ^ current_byte) & 0xFF]
 
-    return _num_to_two_bytes(register, lsb_first=True)
+    return register
+
+
+@functools.lru_cache(maxsize=256)
+def _calculate_request_crc(inputbytes: bytes) -> bytes:
+    """Calculate CRC-16 for a request, remembering it for repeated requests.
+
+    Polling sends the same few requests over and over, so their CRCs are
+    calculated once.
+
+    Args:
+        inputbytes: A request (without the CRC).
+
+    Returns:
+        A two-byte CRC, where the least significant byte is first.
+    """
+    return _calculate_crc(inputbytes)
 
 
 def _calculate_lrc(inputbytes: bytes) -> bytes:
@@ -232,6 +232,33 @@ def wrap_dbus_value(value):
 	return value
 
 
+def _wrap_int(value):
+	if -0x80000000 <= value <= 0x7FFFFFFF:
+		return dbus.Int32(value, variant_level=1)
+	return dbus.Int64(value, variant_level=1)
+
+# Wrap functions for values of a known type, without the type probing of wrap_dbus_value
+_dbus_wrappers = {
+	float: lambda value: dbus.Double(value, variant_level=1),
+	bool: lambda value: dbus.Boolean(value, variant_level=1),
+	int: _wrap_int,
+	str: lambda value: dbus.String(value, variant_level=1),
+}
+
+def get_dbus_wrapper(valuetype):
+	"""Returns a function that wraps values like wrap_dbus_value, with a fast path for values of
+	valuetype. Other values, including None, are passed on to wrap_dbus_value."""
+	wrap = _dbus_wrappers.get(valuetype)
+	if wrap is None:
+		return wrap_dbus_value
+
+	def wrapper(value):
+		if type(value) is valuetype:
+			return wrap(value)
+		return wrap_dbus_value(value)
+	return wrapper
+
+
 dbus_int_types = (dbus.Int32, dbus.UInt32, dbus.Byte, dbus.Int16, dbus.UInt16, dbus.UInt32, dbus.Int64, dbus.UInt64)
 
 
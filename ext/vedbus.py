@@ -7,7 +7,7 @@ import traceback
 import os
 import weakref
 from collections import defaultdict
-from ve_utils import wrap_dbus_value, unwrap_dbus_value
+from ve_utils import wrap_dbus_value, unwrap_dbus_value, get_dbus_wrapper
 
 # vedbus contains three classes:
 # VeDbusItemImport -> use this to read data from the dbus, ie import
@@ -62,6 +62,9 @@ class VeDbusService(object):
 		# dict containing the VeDbusItemExport objects, with their path as the key.
 		self._dbusobjects = {}
 		self._dbusnodes = {}
+		# dict containing, for each tree node path, a dict with the VeDbusItemExport objects below
+		# that node, with their path as the key. Keeps subtree reads proportional to the subtree size.
+		self._subtrees = {}
 		self._ratelimiters = []
 		self._dbusname = None
 
@@ -91,6 +94,7 @@ class VeDbusService(object):
 		for item in list(self._dbusobjects.values()):
 			item.__del__()
 		self._dbusobjects.clear()
+		self._subtrees.clear()
 		if self._dbusname:
 			self._dbusname.__del__()  # Forces call to self._bus.release_name(self._name), see source code
 		self._dbusname = None
@@ -106,14 +110,17 @@ class VeDbusService(object):
 
 		item = VeDbusItemExport(
 				self._dbusconn, path, value, description, writeable,
-				self._value_changed, gettextcallback, deletecallback=self._item_deleted, valuetype=valuetype)
+				self._value_changed, gettextcallback, deletecallback=self._item_deleted, valuetype=valuetype,
+				changedcallback=self._item_changed)
 
 		spl = path.split('/')
 		for i in range(2, len(spl)):
 			subPath = '/'.join(spl[:i])
 			if subPath not in self._dbusnodes and subPath not in self._dbusobjects:
 				self._dbusnodes[subPath] = VeDbusTreeExport(self._dbusconn, subPath, self)
+			self._subtrees.setdefault(subPath, {})[path] = item
 		self._dbusobjects[path] = item
+		self._dbusnodes['/'].invalidate_items()
 		logging.debug('added %s with start value %s. Writeable is %s' % (path, value, writeable))
 
 	# Add the mandatory paths, as per victron dbus api doc
@@ -139,16 +146,32 @@ class VeDbusService(object):
 
 		return self._onchangecallbacks[path](path, newvalue)
 
+	# Callback function that is called from the VeDbusItemExport objects after their value changed,
+	# with the same changes that go out in the PropertiesChanged or ItemsChanged signal.
+	def _item_changed(self, path, changes):
+		root = self._dbusnodes.get('/')
+		if root is not None:
+			root.update_items(path, changes)
+
+	# Only the ancestors of the path are visited: a tree node is removed as soon as no items are
+	# left below it.
 	def _item_deleted(self, path):
 		self._dbusobjects.pop(path)
-		for np in list(self._dbusnodes.keys()):
-			if np != '/':
-				for ip in self._dbusobjects:
-					if ip.startswith(np + '/'):
-						break
-				else:
-					self._dbusnodes[np].__del__()
-					self._dbusnodes.pop(np)
+		root = self._dbusnodes.get('/')
+		if root is not None:
+			root.invalidate_items()
+		spl = path.split('/')
+		for i in range(2, len(spl)):
+			np = '/'.join(spl[:i])
+			subtree = self._subtrees.get(np)
+			if subtree is None:
+				continue
+			subtree.pop(path, None)
+			if not subtree:
+				del self._subtrees[np]
+				node = self._dbusnodes.pop(np, None)
+				if node is not None:
+					node.__del__()
 
 	def __getitem__(self, path):
 		return self._dbusobjects[path].local_get_value()
@@ -415,10 +438,13 @@ class VeDbusTreeExport(dbus.service.Object):
 		px = path
 		if not px.endswith('/'):
 			px += '/'
-		for p, item in self._service._dbusobjects.items():
-			if p.startswith(px):
-				v = item.GetText() if get_text else wrap_dbus_value(item.local_get_value())
-				r[p[len(px):]] = v
+		if path == '/':
+			items = self._service._dbusobjects
+		else:
+			items = self._service._subtrees.get(path, {})
+		for p, item in items.items():
+			v = item.GetText() if get_text else item.GetValue()
+			r[p[len(px):]] = v
 		logging.debug(r)
 		return r
 
@@ -435,18 +461,33 @@ class VeDbusTreeExport(dbus.service.Object):
 		return self._get_value_handler(self.path)
 
 class VeDbusRootExport(VeDbusTreeExport):
+	def __init__(self, bus, objectPath, service):
+		VeDbusTreeExport.__init__(self, bus, objectPath, service)
+		# Snapshot returned by GetItems, kept up to date with the value changes of the items and
+		# rebuilt after paths are added or removed. None when it needs to be rebuilt.
+		self._items = None
+
+	def invalidate_items(self):
+		self._items = None
+
+	def update_items(self, path, changes):
+		if self._items is not None:
+			self._items[path] = changes
+
 	@dbus.service.signal('com.victronenergy.BusItem', signature='a{sa{sv}}')
 	def ItemsChanged(self, changes):
 		pass
 
 	@dbus.service.method('com.victronenergy.BusItem', out_signature='a{sa{sv}}')
 	def GetItems(self):
-		return {
-			path: {
-				'Value': wrap_dbus_value(item.local_get_value()),
-				'Text': item.GetText() }
-			for path, item in self._service._dbusobjects.items()
-		}
+		if self._items is None:
+			self._items = {
+				path: {
+					'Value': item.GetValue(),
+					'Text': item.GetText() }
+				for path, item in self._service._dbusobjects.items()
+			}
+		return self._items
 
 
 class VeDbusItemExport(dbus.service.Object):
@@ -462,9 +503,11 @@ class VeDbusItemExport(dbus.service.Object):
 	# @param callback	  Function that will be called when someone else changes the value of this VeBusItem
 	#                     over the dbus. First parameter passed to callback will be our path, second the new
 	#					  value. This callback should return True to accept the change, False to reject it.
+	# @param changedcallback  Function that will be called after the value changed, with our path and the
+	#                     changes as sent in the PropertiesChanged signal.
 	def __init__(self, bus, objectPath, value=None, description=None, writeable=False,
 					onchangecallback=None, gettextcallback=None, deletecallback=None,
-					valuetype=None):
+					valuetype=None, changedcallback=None):
 		dbus.service.Object.__init__(self, bus, objectPath)
 		self._onchangecallback = onchangecallback
 		self._gettextcallback = gettextcallback
@@ -472,7 +515,13 @@ class VeDbusItemExport(dbus.service.Object):
 		self._description = description
 		self._writeable = writeable
 		self._deletecallback = deletecallback
+		self._changedcallback = changedcallback
 		self._type = valuetype
+		# Converter to the D-Bus type, chosen once for the value type or, if not given, the type of
+		# the initial value
+		self._wrap = get_dbus_wrapper(valuetype if valuetype is not None else type(value))
+		# Text of the current value, None when it needs to be formatted again
+		self._text = None
 
 	# To force immediate deregistering of this dbus object, explicitly call __del__().
 	def __del__(self):
@@ -505,10 +554,14 @@ class VeDbusItemExport(dbus.service.Object):
 			return None
 
 		self._value = newvalue
-		return {
-			'Value': wrap_dbus_value(newvalue),
+		self._text = None
+		changes = {
+			'Value': self._wrap(newvalue),
 			'Text': self.GetText()
 		}
+		if self._changedcallback is not None:
+			self._changedcallback(self.__dbus_object_path__, changes)
+		return changes
 
 	def local_get_value(self):
 		return self._value
@@ -564,13 +617,19 @@ class VeDbusItemExport(dbus.service.Object):
 	# @return the value when valid, and otherwise an empty array
 	@dbus.service.method('com.victronenergy.BusItem', out_signature='v')
 	def GetValue(self):
-		return wrap_dbus_value(self._value)
+		return self._wrap(self._value)
 
 	## Dbus exported method GetText
-	# Returns the value as string of the dbus-object-path.
+	# Returns the value as string of the dbus-object-path. The text is formatted once per value
+	# and cached, so repeated GetText and GetItems calls don't run the gettextcallback again.
 	# @return text A text-value. '---' when local value is invalid
 	@dbus.service.method('com.victronenergy.BusItem', out_signature='s')
 	def GetText(self):
+		if self._text is None:
+			self._text = self._get_text()
+		return self._text
+
+	def _get_text(self):
 		if self._value is None:
 			return '---'
 
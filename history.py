@@ -0,0 +1,131 @@
+import math
+from array import array
+
+import dbus
+import dbus.service
+
+# Sample times are stored as milliseconds since a base time in 32 bits, which covers 49 days.
+# The base moves forward when the newest sample gets close to that limit.
+MAX_OFFSET = 0xFFFFFFFF - 24 * 3600 * 1000
+
+class History(object):
+    # Fixed size ring buffer of recent samples, one array('f') per channel plus one array('I') with
+    # the sample times, so memory use is capped at memory bytes regardless of the uptime
+    def __init__(self, channels, memory, interval=1.0):
+        self.channels = list(channels)
+        self.capacity = max(int(memory // (4 * (len(self.channels) + 1))), 1)
+        self._interval = interval
+        self._times = array('I', bytes(4 * self.capacity))
+        self._values = {channel: array('f', bytes(4 * self.capacity)) for channel in self.channels}
+        self._base = None
+        self._last = None
+        self._next = 0
+        self._count = 0
+
+    def append(self, timestamp, values):
+        # values is a dict by channel, channels that are missing (failed polls) are stored as NaN
+        if self._last is not None and timestamp - self._last < self._interval:
+            return
+        self._last = timestamp
+
+        if self._base is None:
+            self._base = timestamp
+        offset = int((timestamp - self._base) * 1000)
+        if offset > MAX_OFFSET:
+            self._rebase(timestamp)
+            offset = int((timestamp - self._base) * 1000)
+
+        i = self._next
+        self._times[i] = offset
+        for channel in self.channels:
+            value = values.get(channel)
+            self._values[channel][i] = value if value is not None else math.nan
+        self._next = (i + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _rebase(self, timestamp):
+        if self._count == 0:
+            self._base = timestamp
+            return
+        shift = self._times[self._index(0)]
+        if (timestamp - self._base) * 1000 - shift > MAX_OFFSET:
+            # Everything in the buffer is too old to keep
+            self._base = timestamp
+            self._count = 0
+            return
+        for n in range(self._count):
+            i = self._index(n)
+            self._times[i] -= shift
+        self._base += shift / 1000.0
+
+    def _index(self, n):
+        # Position in the arrays of the n-th oldest sample
+        return (self._next - self._count + n) % self.capacity
+
+    def _time(self, n):
+        return self._base + self._times[self._index(n)] / 1000.0
+
+    def _find(self, timestamp):
+        # Number of samples older than timestamp
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._time(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, channel, start, end, step=0):
+        # Samples of channel with start <= time < end. With a step (in s), the samples are averaged
+        # per step, leaving out failed polls, and stamped with the start of the step.
+        values = self._values[channel]
+        times = []
+        result = []
+        bucket = None
+        total = 0.0
+        count = 0
+        for n in range(self._find(start), self._find(end)):
+            t = self._time(n)
+            value = values[self._index(n)]
+            if step <= 0:
+                times.append(t)
+                result.append(value)
+                continue
+            b = start + ((t - start) // step) * step
+            if b != bucket:
+                if count:
+                    times.append(bucket)
+                    result.append(total / count)
+                bucket = b
+                total = 0.0
+                count = 0
+            if not math.isnan(value):
+                total += value
+                count += 1
+        if count:
+            times.append(bucket)
+            result.append(total / count)
+        return times, result
+
+class HistoryExport(dbus.service.Object):
+    # Query interface for the history of a service, for example:
+    # dbus-send --system --print-reply --dest=com.victronenergy.pvinverter.sdm120_pv_51 /History
+    #   com.victronenergy.History.GetRange string:power double:0 double:2e9 double:60
+    def __init__(self, bus, objectPath, history):
+        dbus.service.Object.__init__(self, bus, objectPath)
+        self._history = history
+
+    @dbus.service.method('com.victronenergy.History', out_signature='as')
+    def GetChannels(self):
+        return dbus.Array(self._history.channels, signature='s')
+
+    ## Returns the sample times (unix time) and values of channel in [start, end), averaged per step
+    # seconds when step is not 0. Failed polls are NaN in raw samples.
+    @dbus.service.method('com.victronenergy.History', in_signature='sddd', out_signature='adad')
+    def GetRange(self, channel, start, end, step):
+        if channel not in self._history.channels:
+            raise dbus.exceptions.DBusException('Unknown channel %s' % channel)
+        times, values = self._history.range(str(channel), start, end, step)
+        return dbus.Array(times, signature='d'), dbus.Array(values, signature='d')
@@ -0,0 +1,251 @@
+import asyncio
+import threading
+import time
+import logging
+from collections import namedtuple
+
+import minimalmodbus
+import registermap
+from transport import RtuTransport, Statistics, Transaction
+
+# Result of one poll cycle: the last known good value of each register by name, and the time of
+# its latest successful read (times). Registers that were never read are missing. Samples are never
+# modified after they are published, so the D-Bus side can read them without locking.
+Sample = namedtuple('Sample', 'seq timestamp values times')
+
+class Meter(object):
+    # One slave on the bus. Its registers are polled per group, each group at its own interval
+    # (intervals maps group to seconds), and the groups due in a cycle are read together.
+    # notify is called from the poll thread after each new sample and must be thread safe, for
+    # example by scheduling work on the main loop with GLib.idle_add.
+    def __init__(self, instrument, registers, intervals, notify):
+        self.instrument = instrument
+        self.slave = instrument.address
+        self.registers = registers
+        self.intervals = intervals
+        self.notify = notify
+        self.groups = None
+        self.blocks = None
+        self.values = None
+        self.times = None
+        self.remaining = 0
+        self.transactions = []
+        self.seq = 0
+        self._plans = {}
+        self._read_times = {}
+        self._groups = dict((register.name, register.group) for register in registers)
+        self.statistics = Statistics()
+        self.offline = False  # as last logged
+        self.error = False  # a failure other than a timeout was logged
+
+        # Newest sample, replaced as a whole by the poll thread. Groups not due or failed in a
+        # cycle keep the values of their latest successful read.
+        self.latest = None
+
+    def due(self, now, tick):
+        # A group is due half a tick early, rather than a whole tick late
+        return frozenset(
+            group for group in set(register.group for register in self.registers)
+            if now - self._read_times.get(group, float('-inf')) >= self.intervals[group] - tick / 2)
+
+    def plan(self, groups):
+        blocks = self._plans.get(groups)
+        if blocks is None:
+            blocks = self._plans[groups] = registermap.plan_blocks(
+                [register for register in self.registers if register.group in groups])
+        return blocks
+
+    def read(self, groups, now):
+        self.groups = groups
+        self.blocks = self.plan(groups)
+        self.values = dict(self.latest.values) if self.latest is not None else {}
+        self.times = dict(self.latest.times) if self.latest is not None else {}
+        self.remaining = len(self.blocks)
+        self.transactions = []
+        self._read_times.update((group, now) for group in groups)
+
+    def recent(self, name, now, tick):
+        # Last known good value of a register, None when it was never read or not in its last two
+        # reads due (now is wall clock time)
+        sample = self.latest
+        if sample is None or name not in sample.times:
+            return None
+        if now - sample.times[name] > 2 * max(self.intervals[self._groups[name]], tick):
+            return None
+        return sample.values[name]
+
+    def failed(self, block):
+        # Read the groups of the block again in the next cycle
+        for register in block.registers:
+            self._read_times.pop(register.group, None)
+
+# Fraction of the time the bus may be busy with our polls, the rest is headroom for retries and
+# other masters on the segment
+UTILISATION = 0.5
+
+# Meters below this power are considered idle (night), as for /StatusCode standby
+IDLE_POWER = 10
+
+class AdaptiveInterval(object):
+    # Adapts the poll interval to the measured cost of a poll cycle (round trips plus silent
+    # periods): back off fast when the bus is saturated or erroring, speed up gradually when
+    # there is headroom, and slow down to the maximum while all meters are idle
+    def __init__(self, interval, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = min(max(interval, minimum), maximum)
+        self.cost = None
+
+    def update(self, cost, errors, idle):
+        self.cost = cost if self.cost is None else 0.8 * self.cost + 0.2 * cost
+        target = max(self.cost, cost) / UTILISATION
+
+        if errors:
+            interval = self.interval * 2
+        elif idle:
+            interval = max(self.interval * 1.25, target)
+        elif target > self.interval:
+            interval = target
+        else:
+            interval = max(self.interval * 0.8, target)
+
+        interval = min(max(interval, self.minimum), self.maximum)
+        if abs(interval - self.interval) > 0.1 * self.interval:
+            logging.debug("Poll interval %.0f ms, cycle cost %.0f ms" % (interval * 1000, cost * 1000))
+        self.interval = interval
+        return interval
+
+class Poller(threading.Thread):
+    # Polls all meters on one serial port from its own thread and event loop, so serial latency
+    # and timeouts never delay the GLib main loop. All block reads of a cycle are queued round
+    # robin over the meters on the transport, which sends each next request as soon as the silent
+    # period allows, while the previous response is decoded. Publishing happens on the main loop.
+    # interval is an AdaptiveInterval, the next cycle starts when it is due after the previous one.
+    def __init__(self, meters, interval):
+        threading.Thread.__init__(self, name='poller', daemon=True)
+        self._meters = meters
+        self._serial = meters[0].instrument.serial
+        self.interval = interval
+        self._loop = None
+        self._transport = None
+        self._pending = 0
+        self._errors = 0
+        self._cycle_started = None
+
+        for meter in meters:
+            if meter.instrument.serial is not self._serial:
+                raise ValueError("Meters polled together must share the serial port")
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        self._transport = RtuTransport(self._serial, self._loop)
+        self._loop.call_soon(self._cycle)
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _cycle(self):
+        now = self._cycle_started = self._loop.time()
+        self._errors = 0
+
+        reads = []
+        for meter in self._meters:
+            groups = meter.due(now, self.interval.interval)
+            if groups:
+                meter.read(groups, now)
+                reads.append(meter)
+
+        self._pending = len(reads)
+        if not reads:
+            self._cycle_done()
+            return
+        for index in range(max(len(meter.blocks) for meter in reads)):
+            for meter in reads:
+                if index < len(meter.blocks):
+                    self._read(meter, index)
+
+    def _cycle_done(self):
+        now = self._loop.time()
+        for meter in self._meters:
+            meter.statistics.cycle_time = now - self._cycle_started
+        # Meters that are offline or whose power is unknown do not keep the bus awake
+        wall = time.time()
+        powers = [
+            meter.recent('power', wall, self.interval.interval)
+            for meter in self._meters if not meter.statistics.offline]
+        idle = all(abs(power) < IDLE_POWER for power in powers if power is not None)
+        interval = self.interval.update(now - self._cycle_started, self._errors, idle)
+        self._loop.call_at(max(self._cycle_started + interval, now), self._cycle)
+
+    def _read(self, meter, index):
+        block = meter.blocks[index]
+        transaction = Transaction(
+            meter.slave, 4, block.start, block.count,
+            lambda transaction, response, error: self._block_read(meter, index, transaction, response, error),
+            meter.statistics)
+        meter.transactions.append(transaction)
+        self._transport.submit(transaction)
+
+    def _block_read(self, meter, index, transaction, response, error):
+        if transaction.cancelled:
+            # The meter went offline earlier in the cycle, while this request was on the wire
+            return
+
+        # Each block succeeds or fails on its own, the registers of a failed block keep their
+        # last known good values
+        block = meter.blocks[index]
+        meter.remaining -= 1
+        try:
+            if error is not None:
+                raise error
+
+            meter.values.update(block.decode(response, 3))
+            now = time.time()
+            meter.times.update((register.name, now) for register in block.registers)
+
+            if meter.offline:
+                logging.error("Slave %d is online again" % meter.slave)
+            elif meter.error:
+                logging.warning("Reads of slave %d succeed again" % meter.slave)
+            meter.offline = meter.error = False
+
+        except Exception as e:
+            meter.failed(block)
+            offline = isinstance(e, minimalmodbus.NoResponseError) and meter.statistics.offline
+            if not offline:
+                # Only errors of meters that answer slow down the bus, an absent meter costs just
+                # its short probe timeout
+                self._errors += 1
+            # A meter that is offline or keeps failing fails every cycle, only the first failure
+            # and the recovery are logged above debug level. Timeouts before a meter counts as
+            # offline are retried quietly.
+            if offline and not meter.offline:
+                meter.offline = True
+                logging.error("Slave %d is offline: %r" % (meter.slave, e))
+            elif not isinstance(e, minimalmodbus.NoResponseError) and not meter.error:
+                meter.error = True
+                logging.warning("Block %s of slave %d failed: %r" % (block, meter.slave, e))
+            else:
+                logging.debug("Block %s of slave %d failed: %r" % (block, meter.slave, e))
+
+            if offline:
+                # The other blocks would time out as well
+                for transaction in meter.transactions:
+                    transaction.cancelled = True
+                meter.remaining = 0
+
+        if meter.remaining > 0:
+            return
+
+        meter.seq += 1
+        meter.latest = Sample(meter.seq, time.time(), meter.values, meter.times)
+        meter.values = None
+        meter.times = None
+        meter.transactions = []
+        meter.notify()
+
+        self._pending -= 1
+        if self._pending == 0:
+            self._cycle_done()
@@ -0,0 +1,146 @@
+import struct
+from collections import namedtuple
+
+# Modbus limits a single read to 125 registers
+MAX_BLOCK_COUNT = 125
+
+# Reading an unused register costs 2 bytes of wire time (about 2 ms at 9600 baud). A separate
+# request costs its own request and response frames, the silent period and the turnaround time
+# of the meter, which is worth roughly 40 registers, so smaller gaps are read along.
+MAX_BLOCK_GAP = 40
+
+# name: key of the decoded value
+# address: input register address (function code 4)
+# type: struct format character, 'f' for the IEEE 754 floats of the SDM meters
+# scale: factor applied to the raw value
+# paths: D-Bus paths the value is published on, registers without paths are only polled on request
+# group: polling priority class, 'fast' (power), 'normal' (voltage, current, power factor) or
+#   'slow' (frequency and energy counters), each polled at its own interval
+Register = namedtuple('Register', 'name address type scale paths group')
+
+def _register(name, address, paths=(), group='slow', type='f', scale=1):
+    return Register(name, address, type, scale, paths, group)
+
+SDM120 = (
+    _register('voltage', 0x0000, ('/Ac/Voltage', '/Ac/L1/Voltage'), 'normal'),              #30001 V
+    _register('current', 0x0006, ('/Ac/Current', '/Ac/L1/Current'), 'normal'),              #30007 A
+    _register('power', 0x000C, ('/Ac/Power', '/Ac/L1/Power'), 'fast'),                      #30013 W
+    _register('apparentpower', 0x0012),                                                     #30019 VA
+    _register('reactivepower', 0x0018),                                                     #30025 VAr
+    _register('powerfactor', 0x001E, ('/Ac/L1/PowerFactor',), 'normal'),                    #30031
+    _register('phaseangle', 0x0024),                                                        #30037 Degrees
+    _register('frequency', 0x0046, ('/Ac/L1/Frequency',)),                                  #30071 Hz
+    _register('import', 0x0048, ('/Ac/Energy/Forward', '/Ac/L1/Energy/Forward')),           #30073 kWh
+    _register('export', 0x004A, ('/Ac/L1/Energy/Reverse',)),                                #30075 kWh
+    _register('importreactive', 0x004C),                                                    #30077 kVArh
+    _register('exportreactive', 0x004E),                                                    #30079 kVArh
+    _register('demand', 0x0054),                                                            #30085 W
+    _register('maxdemand', 0x0056),                                                         #30087 W
+    _register('importdemand', 0x0058),                                                      #30089 W
+    _register('maximportdemand', 0x005A),                                                   #30091 W
+    _register('exportdemand', 0x005C),                                                      #30093 W
+    _register('maxexportdemand', 0x005E),                                                   #30095 W
+    _register('currentdemand', 0x0102),                                                     #30259 A
+    _register('maxcurrentdemand', 0x0108),                                                  #30265 A
+    _register('total', 0x0156),                                                             #30343 kWh
+    _register('totalreactive', 0x0158),                                                     #30345 kVArh
+)
+
+SDM630 = (
+    _register('voltage1', 0x0000, ('/Ac/L1/Voltage',), 'normal'),                           #30001 V
+    _register('voltage2', 0x0002, ('/Ac/L2/Voltage',), 'normal'),                           #30003 V
+    _register('voltage3', 0x0004, ('/Ac/L3/Voltage',), 'normal'),                           #30005 V
+    _register('current1', 0x0006, ('/Ac/L1/Current',), 'normal'),                           #30007 A
+    _register('current2', 0x0008, ('/Ac/L2/Current',), 'normal'),                           #30009 A
+    _register('current3', 0x000A, ('/Ac/L3/Current',), 'normal'),                           #30011 A
+    _register('power1', 0x000C, ('/Ac/L1/Power',), 'fast'),                                 #30013 W
+    _register('power2', 0x000E, ('/Ac/L2/Power',), 'fast'),                                 #30015 W
+    _register('power3', 0x0010, ('/Ac/L3/Power',), 'fast'),                                 #30017 W
+    _register('powerfactor1', 0x001E, ('/Ac/L1/PowerFactor',), 'normal'),                   #30031
+    _register('powerfactor2', 0x0020, ('/Ac/L2/PowerFactor',), 'normal'),                   #30033
+    _register('powerfactor3', 0x0022, ('/Ac/L3/PowerFactor',), 'normal'),                   #30035
+    _register('voltage', 0x002A, ('/Ac/Voltage',), 'normal'),                               #30043 V, average line to neutral
+    _register('current', 0x0030, ('/Ac/Current',), 'normal'),                               #30049 A, sum of line currents
+    _register('power', 0x0034, ('/Ac/Power',), 'fast'),                                     #30053 W
+    _register('apparentpower', 0x0038),                                                     #30057 VA
+    _register('reactivepower', 0x003C),                                                     #30061 VAr
+    _register('frequency', 0x0046, ('/Ac/L1/Frequency', '/Ac/L2/Frequency', '/Ac/L3/Frequency')), #30071 Hz
+    _register('import', 0x0048, ('/Ac/Energy/Forward',)),                                   #30073 kWh
+    _register('export', 0x004A, ('/Ac/Energy/Reverse',)),                                   #30075 kWh
+    _register('importreactive', 0x004C),                                                    #30077 kVArh
+    _register('exportreactive', 0x004E),                                                    #30079 kVArh
+    _register('demand', 0x0054),                                                            #30085 W
+    _register('maxdemand', 0x0056),                                                         #30087 W
+    _register('total', 0x0156),                                                             #30343 kWh
+    _register('totalreactive', 0x0158),                                                     #30345 kVArh
+    _register('import1', 0x015A, ('/Ac/L1/Energy/Forward',)),                               #30347 kWh
+    _register('import2', 0x015C, ('/Ac/L2/Energy/Forward',)),                               #30349 kWh
+    _register('import3', 0x015E, ('/Ac/L3/Energy/Forward',)),                               #30351 kWh
+    _register('export1', 0x0160, ('/Ac/L1/Energy/Reverse',)),                               #30353 kWh
+    _register('export2', 0x0162, ('/Ac/L2/Energy/Reverse',)),                               #30355 kWh
+    _register('export3', 0x0164, ('/Ac/L3/Energy/Reverse',)),                               #30357 kWh
+)
+
+# Register map per device_type in config.ini
+DEVICES = {
+    'sdm120': SDM120,
+    'sdm630': SDM630,
+}
+
+def polled(registers, names=()):
+    # The published registers, plus the named ones that are needed without being published
+    return [register for register in registers if register.paths or register.name in names]
+
+def size(register):
+    return struct.calcsize(register.type) // 2
+
+class Block(object):
+    def __init__(self, start, count, registers):
+        self.start = start
+        self.count = count
+        self.registers = registers
+
+        # One precompiled big endian layout for the whole block, skipping the gaps with pad bytes,
+        # so a response is decoded in a single unpack
+        layout = '>'
+        position = start
+        for register in registers:
+            if register.address > position:
+                layout += '%dx' % ((register.address - position) * 2)
+            layout += register.type
+            position = register.address + size(register)
+        if start + count > position:
+            layout += '%dx' % ((start + count - position) * 2)
+        self._layout = struct.Struct(layout)
+        self._decoders = [(register.name, register.scale) for register in registers]
+
+    def decode(self, data, offset=0):
+        # data: a response, with the register bytes of the block starting at offset
+        return {
+            name: value * scale if scale != 1 else value
+            for (name, scale), value in zip(self._decoders, self._layout.unpack_from(data, offset))
+        }
+
+    def __repr__(self):
+        return '0x%04X+%d' % (self.start, self.count)
+
+def plan_blocks(registers, max_gap=MAX_BLOCK_GAP, max_count=MAX_BLOCK_COUNT):
+    # Merge the registers into as few block reads as possible
+    blocks = []
+    members = []
+    start = None
+    end = None
+    for register in sorted(registers, key=lambda register: register.address):
+        last = register.address + size(register)
+        if start is not None and register.address - end <= max_gap and last - start <= max_count:
+            end = max(end, last)
+        else:
+            if start is not None:
+                blocks.append(Block(start, end - start, members))
+            members = []
+            start = register.address
+            end = last
+        members.append(register)
+    if start is not None:
+        blocks.append(Block(start, end - start, members))
+    return blocks
@@ -5,7 +5,7 @@ import platform
 import logging
 import sys
 import os
-import _thread
+import time
 import serial
 import configparser
 import dbus
@@ -14,6 +14,11 @@ import dbus.service
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'ext'))
 from vedbus import VeDbusService
 import minimalmodbus
+import registermap
+from poller import AdaptiveInterval, Meter, Poller
+from transport import ROUNDTRIP_BUCKETS
+from history import History, HistoryExport
+import energylog
 
 class SystemBus(dbus.bus.BusConnection):
     def __new__(cls):
@@ -32,53 +37,44 @@ class DbusSdm120PvService:
         deviceinstance,
         paths,
         serial_port,
+        slave = 1,
+        device_type = 'sdm120',
         productname = 'PV house',
         max_power = 3000,
         position = 1,
-        offset = 0.0
+        offset = 0.0,
+        intervals = {'fast': 0.25, 'normal': 1.0, 'slow': 30.0},
+        publish_interval = 0.0,
+        history = None,
+        energy_log = None,
+        diagnostics_interval = 10.0,
+        timeout = 0.1,
+        stale_timeout = 10.0
     ):
 
         logging.basicConfig(level=logging.WARNING)
         #logging.basicConfig(level=logging.INFO)
 
         self._offset = offset;
+        self._energy_log = energy_log
+        self._publish_interval = publish_interval
+        self._published = {}
+        self._publish_time = None
+        self._publish_time_max = 0.0
 
         #https://minimalmodbus.readthedocs.io/en/stable/usage.html
-        self._instrument = minimalmodbus.Instrument(serial_port, 1)
+        #Instruments on the same serial port share the port
+        self._instrument = minimalmodbus.Instrument(serial_port, slave)
         self._instrument.serial.baudrate = 9600
         self._instrument.serial.bytesize = 8
         self._instrument.serial.parity   = serial.PARITY_NONE
         self._instrument.serial.stopbits = 1
-        self._instrument.serial.timeout  = 0.1
+        self._instrument.serial.timeout  = timeout  # at most, the timeouts adapt to the meters
         self._instrument.mode = minimalmodbus.MODE_RTU
         #self._instrument.debug = True
 
-        #30001 Voltage Volts 0000
-        #30007 Current Amps 0006
-        #30013 Active Power Watts 000C
-        #30019 Apparent Power VoltAmps 0012
-        #30025 Reactive Power VAr 0018
-        #30031 Power Factor None 001E
-        #30037 Phase Angle Degrees 0024
-        #30071 Frequency Hz 0046
-        #30073 Import Active Energy kWh 0048
-        #30075 Export Active Energy kWh 004A
-        #30077 Import Reactive Energy kVArh 004C
-        #30079 Export Reactive Energy kVArh 004E
-
-        #30085 Total system power demand W 0054
-        #30087 Maximum total system power demand W 0056
-        #30089 Import system power demand W 0058
-        #30091 Maximum Import system power demand W 005A
-        #30093 Export system power demand W 005C
-        #30095 Maximum Export system power demand W 005E
-        #30259 Current demand Amps 0102
-        #30265 Maximum current demand Amps 0108
-
-        #30343 Total Active Energy kWh 0156
-        #30345 Total Reactive Energy kVArh 0158
-
-        self._dbusservice = VeDbusService('com.victronenergy.pvinverter.sdm120_pv_' + str(deviceinstance), dbusconnection())
+        # Each service has its own connection, so several meters can be exported from one process
+        self._dbusservice = VeDbusService('com.victronenergy.pvinverter.' + device_type + '_pv_' + str(deviceinstance), dbusconnection())
         self._paths = paths
 
         logging.debug("DeviceInstance = %d" % (deviceinstance))
@@ -102,152 +98,306 @@ class DbusSdm120PvService:
         self._dbusservice.add_path('/Position', position)
         self._dbusservice.add_path('/StatusCode', 0)  # Dummy path so VRM detects us as a PV-inverter
 
+        # Bus health, times in ms, counters since the start of the driver
+        self._dbusservice.add_path('/Diagnostics/Requests', 0)
+        self._dbusservice.add_path('/Diagnostics/Timeouts', 0)
+        self._dbusservice.add_path('/Diagnostics/CrcErrors', 0)
+        self._dbusservice.add_path('/Diagnostics/Errors', 0)
+        self._dbusservice.add_path('/Diagnostics/LateResponses', 0)
+        self._dbusservice.add_path('/Diagnostics/Timeout', None, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/RoundTrip/Last', None, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/RoundTrip/Average', None, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/RoundTrip/Max', None, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/RoundTrip/Buckets', [round(bucket * 1000) for bucket in ROUNDTRIP_BUCKETS])
+        self._dbusservice.add_path('/Diagnostics/RoundTrip/Histogram', [0] * (len(ROUNDTRIP_BUCKETS) + 1))
+        self._dbusservice.add_path('/Diagnostics/SilentPeriodSleep', 0.0, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/CycleTime', None, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/PublishTime/Last', None, valuetype=float)
+        self._dbusservice.add_path('/Diagnostics/PublishTime/Max', None, valuetype=float)
+
         for path, settings in self._paths.items():
             self._dbusservice.add_path(
                 path,
                 settings['initial'],
                 gettextcallback = settings['textformat'],
+                valuetype = settings.get('valuetype'),
                 writeable = True,
                 onchangecallback = self._handlechangedvalue
                 )
 
         self._dbusservice['/Ac/MaxPower'] = max_power
 
-        GLib.timeout_add(1000, self._update)
+        # Recent samples, queried over D-Bus on /History of the service
+        self._history = history
+        if history is not None:
+            self._history_export = HistoryExport(self._dbusservice.dbusconn, '/History', history)
 
-    def _update(self):
-        v = None
-        c = None
-        a = None
-        p = None
-        f = None
-        i = None
-        e = None
-        t = None
-
-        try:
-            v = self._instrument.read_float(0x0000, 4, 2) #Voltage
-            c = self._instrument.read_float(0x0006, 4, 2) #Current
-            a = self._instrument.read_float(0x000C, 4, 2) #Active power
-            p = self._instrument.read_float(0x001E, 4, 2) #Power factor
-            f = self._instrument.read_float(0x0046, 4, 2) #Frequency
-            i = self._instrument.read_float(0x0048, 4, 2) #Import active
-            e = self._instrument.read_float(0x004A, 4, 2) #Export active
-            t = self._instrument.read_float(0x0156, 4, 2) #Total active
-
-            i = i + self._offset
-
-            logging.info("PV: {:.1f} W - {:.1f} V - {:.1f} A - {:.1f} Import".format(a, v, c, i))
-
-        except Exception:
-            exception_type, exception_object, exception_traceback = sys.exc_info()
-            file = exception_traceback.tb_frame.f_code.co_filename
-            line = exception_traceback.tb_lineno
-            print(f"Exception occurred: {repr(exception_object)} of type {exception_type} in {file} line #{line}")
-            logging.error(f"Exception occurred: {repr(exception_object)} of type {exception_type} in {file} line #{line}")
-
-        self._dbusservice['/Ac/Power'] = round(a, 2) if a is not None else None
-        self._dbusservice['/Ac/Current'] = round(c, 2) if c is not None else None
-        self._dbusservice['/Ac/Voltage'] = round(v, 2) if v is not None else None
-        self._dbusservice['/Ac/Energy/Forward'] = round(i, 2) if i is not None else None
-
-        self._dbusservice['/Ac/L1/Power'] = round(a, 2) if a is not None else None
-        self._dbusservice['/Ac/L1/Current'] = round(c, 2) if c is not None else None
-        self._dbusservice['/Ac/L1/Voltage'] = round(v, 2) if v is not None else None
-        self._dbusservice['/Ac/L1/Frequency'] = round(f, 2) if f is not None else None
-        self._dbusservice['/Ac/L1/PowerFactor'] = round(p, 2) if p is not None else None
-        self._dbusservice['/Ac/L1/Energy/Forward'] = round(i, 2) if i is not None else None
-        self._dbusservice['/Ac/L1/Energy/Reverse'] = round(e, 2) if e is not None else None
-
-        if self._dbusservice['/Ac/Power'] is not None and self._dbusservice['/Ac/Power'] >= 10:
-            if self._dbusservice['/StatusCode'] != 7:
-                self._dbusservice['/StatusCode'] = 7 #running
-        else:
-            if self._dbusservice['/StatusCode'] != 8:
-                self._dbusservice['/StatusCode'] = 8 #standby
-
-        # increment UpdateIndex - to show that new data is available
-        index = self._dbusservice['/UpdateIndex'] + 1
-        if index > 255:
-            index = 0
-        self._dbusservice['/UpdateIndex'] = index
-
-        return True
+        # The registers due in a cycle are coalesced into as few block reads as possible
+        self._registers = registermap.polled(registermap.DEVICES[device_type], energylog.COUNTERS)
+        logging.info("Register blocks of slave %d: %s" % (slave, registermap.plan_blocks(self._registers)))
 
-    def _handlechangedvalue(self, path, value):
-        logging.debug("someone else updated %s to %s" % (path, value))
-        return True  # accept the change
+        # Polled from the poll thread of the serial port, the main loop only publishes the newest sample
+        self._seq = 0
+        self.meter = Meter(self._instrument, self._registers, intervals, lambda: GLib.idle_add(self._update))
 
-def main():
-    _thread.daemon = True  # allow the program to quit
+        # A value that was not read successfully for this long (in s) is invalidated, until then the
+        # last known good value stays published. Groups polled less often get more time.
+        self._stale = {
+            register.name: max(stale_timeout, 2 * intervals[register.group]) for register in self._registers
+        }
 
-    from dbus.mainloop.glib import DBusGMainLoop
+        if diagnostics_interval > 0:
+            GLib.timeout_add(int(diagnostics_interval * 1000), self._diagnostics)
 
-    DBusGMainLoop(set_as_default=True)
+    def _update(self):
+        sample = self.meter.latest
+        if sample is not None and sample.seq != self._seq:
+            self._seq = sample.seq
+            values = {
+                name: value for name, value in sample.values.items()
+                if sample.timestamp - sample.times[name] <= self._stale[name]
+            }
+            if self._energy_log is not None:
+                values = self._energy_log.update(sample.timestamp, values)
+            elif 'import' in values:
+                values['import'] = values['import'] + self._offset
+
+            logging.info("PV: {} W - {} V - {} A - {} Import".format(
+                values.get('power'), values.get('voltage'), values.get('current'), values.get('import')))
+
+            if self._history is not None:
+                self._history.append(sample.timestamp, values)
+            started = time.perf_counter()
+            self._publish(values)
+            self._publish_time = time.perf_counter() - started
+            self._publish_time_max = max(self._publish_time_max, self._publish_time)
+        return False
+
+    def _diagnostics(self):
+        statistics = self.meter.statistics
+        def _ms(seconds): return round(seconds * 1000, 1) if seconds is not None else None
+
+        # Per register block, added when first read. Path elements cannot hold the + of 0x0000+76.
+        blocks = [('/Diagnostics/Blocks/0x%04X_%d' % key, block) for key, block in sorted(list(statistics.blocks.items()))]
+        for path, block in blocks:
+            if path + '/Requests' not in self._dbusservice:
+                for name in ('/Requests', '/Errors'):
+                    self._dbusservice.add_path(path + name, 0)
+                for name in ('/RoundTrip/Last', '/RoundTrip/Average', '/RoundTrip/Max'):
+                    self._dbusservice.add_path(path + name, None, valuetype=float)
+
+        with self._dbusservice as ctx:
+            ctx['/Diagnostics/Requests'] = statistics.requests
+            ctx['/Diagnostics/Timeouts'] = statistics.timeouts
+            ctx['/Diagnostics/CrcErrors'] = statistics.crc_errors
+            ctx['/Diagnostics/Errors'] = statistics.errors
+            ctx['/Diagnostics/LateResponses'] = statistics.late
+            ctx['/Diagnostics/Timeout'] = _ms(statistics.deadline(self._instrument.serial.timeout))
+            histogram = list(statistics.histogram)
+            ctx['/Diagnostics/RoundTrip/Histogram'] = histogram
+            ctx['/Diagnostics/RoundTrip/Last'] = _ms(statistics.roundtrip_time)
+            if sum(histogram):
+                ctx['/Diagnostics/RoundTrip/Average'] = _ms(statistics.roundtrip_total / sum(histogram))
+                ctx['/Diagnostics/RoundTrip/Max'] = _ms(statistics.roundtrip_max)
+            ctx['/Diagnostics/SilentPeriodSleep'] = _ms(statistics.sleep_time)
+            ctx['/Diagnostics/CycleTime'] = _ms(statistics.cycle_time)
+            ctx['/Diagnostics/PublishTime/Last'] = _ms(self._publish_time)
+            ctx['/Diagnostics/PublishTime/Max'] = _ms(self._publish_time_max)
+            ctx['/Latency'] = _ms(statistics.roundtrip_time)
+            for path, block in blocks:
+                ctx[path + '/Requests'] = block.requests
+                ctx[path + '/Errors'] = block.errors
+                ctx[path + '/RoundTrip/Last'] = _ms(block.roundtrip_time)
+                if block.requests > block.errors:
+                    ctx[path + '/RoundTrip/Average'] = _ms(block.roundtrip_total / (block.requests - block.errors))
+                    ctx[path + '/RoundTrip/Max'] = _ms(block.roundtrip_max)
+        return True  # keep the timer running
+
+    def _publish(self, values):
+        # All changes of a cycle are sent as a single ItemsChanged signal when the context exits
+        with self._dbusservice as ctx:
+            now = time.monotonic()
+            changed = False
+            for register in self._registers:
+                value = values.get(register.name)
+                if value is not None:
+                    value = round(value, 2)
+                for path in register.paths:
+                    if self._publishable(path, value, now):
+                        ctx[path] = value
+                        self._published[path] = now
+                        changed = True
+
+            if not changed:
+                return
+
+            if ctx['/Ac/Power'] is not None and ctx['/Ac/Power'] >= 10:
+                if ctx['/StatusCode'] != 7:
+                    ctx['/StatusCode'] = 7 #running
+            else:
+                if ctx['/StatusCode'] != 8:
+                    ctx['/StatusCode'] = 8 #standby
+
+            # increment UpdateIndex - to show that new data is available
+            index = ctx['/UpdateIndex'] + 1
+            if index > 255:
+                index = 0
+            ctx['/UpdateIndex'] = index
+
+    def _publishable(self, path, value, now):
+        current = self._dbusservice[path]
+        if value == current:
+            return False
+
+        # Becoming valid or invalid is always published
+        if value is None or current is None:
+            return True
+
+        if now - self._published.get(path, float('-inf')) < self._publish_interval:
+            return False
+
+        # Changes within the deadband of the path are not published
+        settings = self._paths.get(path, {})
+        deadband = max(settings.get('deadband', 0), settings.get('deadband_relative', 0) * abs(current))
+        return abs(value - current) > deadband
 
-    config_file = (os.path.dirname(os.path.realpath(__file__))) + "/config.ini"
-    config = configparser.ConfigParser()
-    config.read(config_file)
+    def _handlechangedvalue(self, path, value):
+        logging.debug("someone else updated %s to %s" % (path, value))
+        return True  # accept the change
 
-    # formatting
-    def _kwh(p, v): return (str("%.2f" % v) + "kWh")
-    def _a(p, v): return (str("%.1f" % v) + "A")
-    def _w(p, v): return (str("%i" % v) + "W")
-    def _v(p, v): return (str("%.2f" % v) + "V")
-    def _hz(p, v): return (str("%.4f" % v) + "Hz")
-    def _n(p, v): return (str("%i" % v))
-    def _pf(p, v): return (str("%.2f" % v))
+def dbus_paths(config):
+    # deadband, absolute in the unit of the value or relative when ending with %
+    def _deadband(name, default):
+        setting = config['DEFAULT'].get('deadband_' + name, default).strip()
+        if setting.endswith('%'):
+            return {'deadband_relative': float(setting[:-1]) / 100}
+        return {'deadband': float(setting)}
+
+    _dbw = _deadband('power', '1')
+    _dba = _deadband('current', '0.05')
+    _dbv = _deadband('voltage', '0.5')
+    _dbhz = _deadband('frequency', '0.02')
+    _dbpf = _deadband('powerfactor', '0.01')
+
+    # formatting, a single string formatting operation per text
+    def _format(template): return lambda p, v: template % v
+    _kwh = _format("%.2fkWh")
+    _a = _format("%.1fA")
+    _w = _format("%iW")
+    _v = _format("%.2fV")
+    _hz = _format("%.4fHz")
+    _n = _format("%i")
+    _pf = _format("%.2f")
 
     paths_dbus = {
-        '/Ac/Power': {'initial': 0, 'textformat': _w},
-        '/Ac/Current': {'initial': 0, 'textformat': _a},
-        '/Ac/Voltage': {'initial': 0, 'textformat': _v},
-        '/Ac/Energy/Forward': {'initial': None, 'textformat': _kwh},
-        '/Ac/Energy/Reverse': {'initial': None, 'textformat': _kwh},
+        '/Ac/Power': {'initial': 0, 'valuetype': float, 'textformat': _w, **_dbw},
+        '/Ac/Current': {'initial': 0, 'valuetype': float, 'textformat': _a, **_dba},
+        '/Ac/Voltage': {'initial': 0, 'valuetype': float, 'textformat': _v, **_dbv},
+        '/Ac/Energy/Forward': {'initial': None, 'valuetype': float, 'textformat': _kwh},
+        '/Ac/Energy/Reverse': {'initial': None, 'valuetype': float, 'textformat': _kwh},
 
         '/Ac/MaxPower': {'initial': 0, 'textformat': _w},
-        '/Ac/Position': {'initial': int(config['DEFAULT']['inverter_position']), 'textformat': _n},
-        '/Ac/StatusCode': {'initial': 0, 'textformat': _n},
-        '/UpdateIndex': {'initial': 0, 'textformat': _n},
+        '/Ac/Position': {'initial': int(config['DEFAULT']['inverter_position']), 'valuetype': int, 'textformat': _n},
+        '/Ac/StatusCode': {'initial': 0, 'valuetype': int, 'textformat': _n},
+        '/UpdateIndex': {'initial': 0, 'valuetype': int, 'textformat': _n},
     }
 
     paths_dbus.update({
-        '/Ac/L1/Power': {'initial': None, 'textformat': _w},
-        '/Ac/L1/Current': {'initial': None, 'textformat': _a},
-        '/Ac/L1/Voltage': {'initial': None, 'textformat': _v},
-        '/Ac/L1/Frequency': {'initial': None, 'textformat': _hz},
-        '/Ac/L1/PowerFactor': {'initial': None, 'textformat': _pf},
-        '/Ac/L1/Energy/Forward': {'initial': None, 'textformat': _kwh},
-        '/Ac/L1/Energy/Reverse': {'initial': None, 'textformat': _kwh},
+        '/Ac/L1/Power': {'initial': None, 'valuetype': float, 'textformat': _w, **_dbw},
+        '/Ac/L1/Current': {'initial': None, 'valuetype': float, 'textformat': _a, **_dba},
+        '/Ac/L1/Voltage': {'initial': None, 'valuetype': float, 'textformat': _v, **_dbv},
+        '/Ac/L1/Frequency': {'initial': None, 'valuetype': float, 'textformat': _hz, **_dbhz},
+        '/Ac/L1/PowerFactor': {'initial': None, 'valuetype': float, 'textformat': _pf, **_dbpf},
+        '/Ac/L1/Energy/Forward': {'initial': None, 'valuetype': float, 'textformat': _kwh},
+        '/Ac/L1/Energy/Reverse': {'initial': None, 'valuetype': float, 'textformat': _kwh},
     })
 
     paths_dbus.update({
-        '/Ac/L2/Power': {'initial': None, 'textformat': _w},
-        '/Ac/L2/Current': {'initial': None, 'textformat': _a},
-        '/Ac/L2/Voltage': {'initial': None, 'textformat': _v},
-        '/Ac/L2/Frequency': {'initial': None, 'textformat': _hz},
-        '/Ac/L2/Energy/Forward': {'initial': None, 'textformat': _kwh},
-        '/Ac/L2/Energy/Reverse': {'initial': None, 'textformat': _kwh},
+        '/Ac/L2/Power': {'initial': None, 'valuetype': float, 'textformat': _w, **_dbw},
+        '/Ac/L2/Current': {'initial': None, 'valuetype': float, 'textformat': _a, **_dba},
+        '/Ac/L2/Voltage': {'initial': None, 'valuetype': float, 'textformat': _v, **_dbv},
+        '/Ac/L2/Frequency': {'initial': None, 'valuetype': float, 'textformat': _hz, **_dbhz},
+        '/Ac/L2/PowerFactor': {'initial': None, 'valuetype': float, 'textformat': _pf, **_dbpf},
+        '/Ac/L2/Energy/Forward': {'initial': None, 'valuetype': float, 'textformat': _kwh},
+        '/Ac/L2/Energy/Reverse': {'initial': None, 'valuetype': float, 'textformat': _kwh},
     })
 
     paths_dbus.update({
-        '/Ac/L3/Power': {'initial': None, 'textformat': _w},
-        '/Ac/L3/Current': {'initial': None, 'textformat': _a},
-        '/Ac/L3/Voltage': {'initial': None, 'textformat': _v},
-        '/Ac/L3/Frequency': {'initial': None, 'textformat': _hz},
-        '/Ac/L3/Energy/Forward': {'initial': None, 'textformat': _kwh},
-        '/Ac/L3/Energy/Reverse': {'initial': None, 'textformat': _kwh},
+        '/Ac/L3/Power': {'initial': None, 'valuetype': float, 'textformat': _w, **_dbw},
+        '/Ac/L3/Current': {'initial': None, 'valuetype': float, 'textformat': _a, **_dba},
+        '/Ac/L3/Voltage': {'initial': None, 'valuetype': float, 'textformat': _v, **_dbv},
+        '/Ac/L3/Frequency': {'initial': None, 'valuetype': float, 'textformat': _hz, **_dbhz},
+        '/Ac/L3/PowerFactor': {'initial': None, 'valuetype': float, 'textformat': _pf, **_dbpf},
+        '/Ac/L3/Energy/Forward': {'initial': None, 'valuetype': float, 'textformat': _kwh},
+        '/Ac/L3/Energy/Reverse': {'initial': None, 'valuetype': float, 'textformat': _kwh},
     })
 
-    DbusSdm120PvService(
-        deviceinstance = int(config['DEFAULT']['device_instance']),
-        paths = paths_dbus,
-        serial_port = config['DEFAULT']['serial_port'],
-        productname = config['DEFAULT']['device_name'],
-        max_power = int(config['DEFAULT']['max_inverter_power']),
-        position = int(config['DEFAULT']['inverter_position']),
-        offset = float(config['DEFAULT']['meter_offset'])
-    )
+    return paths_dbus
+
+def main():
+    from dbus.mainloop.glib import DBusGMainLoop
+
+    DBusGMainLoop(set_as_default=True)
+
+    config_file = (os.path.dirname(os.path.realpath(__file__))) + "/config.ini"
+    config = configparser.ConfigParser()
+    config.read(config_file)
+
+    paths_dbus = dbus_paths(config)
+
+    # Without meter sections, the DEFAULT section describes the only meter
+    sections = [config[name] for name in config.sections()] or [config['DEFAULT']]
+
+    # Poll interval per register group (in s)
+    intervals = {
+        group: int(config['DEFAULT'].get('poll_interval_' + group, default)) / 1000.0
+        for group, default in (('fast', 250), ('normal', 1000), ('slow', 30000))
+    }
+
+    # History of recent samples, memory in kB per meter
+    history_channels = [channel.strip() for channel in config['DEFAULT'].get('history_channels', 'power, voltage, current').split(',')]
+    history_memory = int(config['DEFAULT'].get('history_memory', 2048)) * 1024
+    history_interval = int(config['DEFAULT'].get('history_interval', 1000)) / 1000.0
+
+    # Checkpoints of the energy counters, per meter
+    energy_log_dir = config['DEFAULT'].get('energy_log_dir', os.path.dirname(os.path.realpath(__file__))).strip()
+
+    services = []
+    for section in sections:
+        paths = dict(paths_dbus)
+        paths['/Ac/Position'] = dict(paths_dbus['/Ac/Position'], initial=int(section['inverter_position']))
+
+        services.append(DbusSdm120PvService(
+            deviceinstance = int(section['device_instance']),
+            paths = paths,
+            serial_port = config['DEFAULT']['serial_port'],
+            slave = int(section.get('slave_address', 1)),
+            device_type = section.get('device_type', 'sdm120'),
+            productname = section['device_name'],
+            max_power = int(section['max_inverter_power']),
+            position = int(section['inverter_position']),
+            offset = float(section['meter_offset']),
+            intervals = intervals,
+            publish_interval = int(config['DEFAULT'].get('publish_interval_min', 0)) / 1000.0,
+            diagnostics_interval = int(config['DEFAULT'].get('diagnostics_interval', 10000)) / 1000.0,
+            timeout = int(config['DEFAULT'].get('timeout', 100)) / 1000.0,
+            stale_timeout = int(config['DEFAULT'].get('stale_timeout', 10000)) / 1000.0,
+            history = History(history_channels, history_memory, history_interval) if history_memory > 0 else None,
+            energy_log = energylog.EnergyLog(
+                os.path.join(energy_log_dir, 'energy_%d.log' % int(section['device_instance'])),
+                int(section['max_inverter_power']),
+                {'import': float(section['meter_offset'])},
+                int(config['DEFAULT'].get('energy_log_interval', 900000)) / 1000.0,
+                float(config['DEFAULT'].get('energy_log_delta', 0.1))) if energy_log_dir else None
+        ))
+
+    # One poll thread owns the serial port and polls the meters round robin, as fast as the bus allows
+    interval = AdaptiveInterval(
+        int(config['DEFAULT'].get('poll_interval', 1000)) / 1000.0,
+        int(config['DEFAULT'].get('poll_interval_min', 250)) / 1000.0,
+        int(config['DEFAULT'].get('poll_interval_max', 5000)) / 1000.0)
+    poller = Poller([service.meter for service in services], interval)
+    poller.start()
 
     logging.info('Connected to dbus and switching over to GLib.MainLoop() (= event based)')
     mainloop = GLib.MainLoop()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+# Simulated SDM120/SDM630 meters on a pseudo terminal, for running the driver and benchmarks
+# without hardware. For example:
+#   ./simulator.py --link /tmp/ttySDM --meter 1:sdm120 --meter 2:sdm630 --latency 20 --drop 0.01
+# and serial_port = /tmp/ttySDM in config.ini.
+
+import os
+import sys
+import pty
+import tty
+import math
+import time
+import random
+import select
+import struct
+import argparse
+import threading
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'ext'))
+import minimalmodbus
+import registermap
+
+# Registers served, reads beyond this are answered with an illegal address exception
+REGISTERS = 0x0200
+
+# Bytes per write of a response
+CHUNK = 32
+
+class SimulatedMeter(object):
+    # Values of a meter at time t: PV power following a shortened day of period s, with voltage,
+    # current and frequency around it and energy counters integrating the power
+    def __init__(self, slave, device_type, max_power=3000, period=600.0):
+        self.slave = slave
+        self.registers = registermap.DEVICES[device_type]
+        self.phases = 3 if device_type == 'sdm630' else 1
+        self.max_power = max_power
+        self.period = period
+        self.started = time.time()
+        self.energy = 1000.0
+        self._time = self.started
+
+    def values(self, t):
+        power = max(self.max_power * math.sin(2 * math.pi * (t - self.started) / self.period), 0.0)
+        self.energy += power * (t - self._time) / 3600 / 1000
+        self._time = t
+
+        voltage = 230 + 2 * math.sin(t / 7)
+        values = {
+            'voltage': voltage,
+            'current': power / voltage,
+            'power': power,
+            'apparentpower': power / 0.99,
+            'powerfactor': 0.99,
+            'frequency': 50 + 0.02 * math.sin(t / 11),
+            'import': self.energy,
+            'export': 0.0,
+            'total': self.energy,
+        }
+        for phase in range(1, self.phases + 1):
+            values['voltage%d' % phase] = voltage + phase / 10
+            values['current%d' % phase] = power / self.phases / voltage
+            values['power%d' % phase] = power / self.phases
+            values['powerfactor%d' % phase] = 0.99
+            values['import%d' % phase] = self.energy / self.phases
+            values['export%d' % phase] = 0.0
+        return values
+
+    def image(self, t):
+        # All registers as the meter would answer them, unknown registers are 0
+        image = bytearray(2 * REGISTERS)
+        values = self.values(t)
+        for register in self.registers:
+            struct.pack_into('>' + register.type, image, 2 * register.address,
+                values.get(register.name, 0.0) / register.scale)
+        return image
+
+class Simulator(threading.Thread):
+    # Modbus RTU slave side of a pty pair, port is the device name for the master. latency and
+    # jitter (in s) delay each response, crc_error and drop are the probabilities that a response
+    # is corrupted or not sent at all. With a seed, the faults are reproducible.
+    def __init__(self, meters, latency=0.0, jitter=0.0, crc_error=0.0, drop=0.0, baudrate=9600, seed=None):
+        threading.Thread.__init__(self, name='simulator', daemon=True)
+        self.meters = dict((meter.slave, meter) for meter in meters)
+        self.latency = latency
+        self.jitter = jitter
+        self.crc_error = crc_error
+        self.drop = drop
+        self.baudrate = baudrate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.responses = 0
+        self.received = 0  # bytes
+        self.sent = 0
+        self.cpu = 0.0  # s of the simulator thread
+        self._master, slave = pty.openpty()
+        tty.setraw(slave)
+        self._slave = slave
+        self.port = os.ttyname(slave)
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self):
+        buffer = bytearray()
+        while not self._stopped:
+            readable, _, _ = select.select([self._master], [], [], 0.1)
+            if not readable:
+                # A silent period ends a frame, drop incomplete requests
+                del buffer[:]
+                continue
+            data = os.read(self._master, 256)
+            self.received += len(data)
+            buffer += data
+            while len(buffer) >= 8:
+                request = bytes(buffer[:8])
+                del buffer[:8]
+                if minimalmodbus._crc16(request) != 0:
+                    # A real slave ignores the frame, as does the rest of the buffer
+                    del buffer[:]
+                    break
+                self._request(request)
+            self.cpu = time.thread_time()
+
+    def _request(self, request):
+        slave, functioncode, start, count = struct.unpack_from('>BBHH', request)
+        meter = self.meters.get(slave)
+        if meter is None:
+            return
+        self.requests += 1
+
+        if functioncode not in (3, 4):
+            response = struct.pack('>BBB', slave, functioncode | 0x80, 1)
+        elif count < 1 or count > registermap.MAX_BLOCK_COUNT:
+            response = struct.pack('>BBB', slave, functioncode | 0x80, 3)
+        elif start + count > REGISTERS:
+            response = struct.pack('>BBB', slave, functioncode | 0x80, 2)
+        else:
+            data = meter.image(time.time())[2 * start:2 * (start + count)]
+            response = struct.pack('>BBB', slave, functioncode, 2 * count) + bytes(data)
+        response += minimalmodbus._calculate_crc(response)
+
+        if self.random.random() < self.drop:
+            return
+        if self.random.random() < self.crc_error:
+            response = response[:-1] + bytes([response[-1] ^ 0xFF])
+
+        # Turnaround time of the meter, then the response at the pace of the wire, in chunks as
+        # USB serial adapters pass it on
+        time.sleep(self.latency + self.random.uniform(0, self.jitter))
+        for chunk in range(0, len(response), CHUNK):
+            time.sleep(len(response[chunk:chunk + CHUNK]) * 10.0 / self.baudrate)
+            os.write(self._master, response[chunk:chunk + CHUNK])
+        self.responses += 1
+        self.sent += len(response)
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated SDM120/SDM630 meters on a pseudo terminal')
+    parser.add_argument('--meter', action='append', default=[], metavar='SLAVE:TYPE',
+        help='slave address and device type, for example 1:sdm120 (default), may be repeated')
+    parser.add_argument('--link', help='symbolic link to the pseudo terminal, for example /tmp/ttySDM')
+    parser.add_argument('--latency', type=float, default=10, help='turnaround time of the meters (in ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='random extra turnaround time up to (in ms)')
+    parser.add_argument('--crc-error', type=float, default=0, help='probability of a corrupted response')
+    parser.add_argument('--drop', type=float, default=0, help='probability of a missing response')
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--seed', type=int, help='seed for reproducible faults')
+    parser.add_argument('--check', action='store_true', help='read all registers once and exit')
+    args = parser.parse_args()
+
+    meters = []
+    for meter in args.meter or ['1:sdm120']:
+        slave, device_type = meter.split(':')
+        meters.append(SimulatedMeter(int(slave), device_type))
+
+    simulator = Simulator(
+        meters, args.latency / 1000.0, args.jitter / 1000.0, args.crc_error, args.drop, args.baudrate, args.seed)
+    simulator.start()
+
+    if args.check:
+        # Loopback through minimalmodbus, reading the register blocks as the driver plans them
+        for meter in meters:
+            instrument = minimalmodbus.Instrument(simulator.port, meter.slave)
+            instrument.serial.baudrate = args.baudrate
+            instrument.serial.timeout = 0.5
+            for block in registermap.plan_blocks(meter.registers):
+                instrument.add_poll(repr(block), block.start, block.count, functioncode=4)
+            for block in registermap.plan_blocks(meter.registers):
+                try:
+                    values = block.decode(instrument.poll(repr(block)))
+                except Exception as e:
+                    print("%d %s %r" % (meter.slave, block, e))
+                    continue
+                for register in block.registers:
+                    print("%d %-16s 0x%04X %12.3f %.1f ms" % (
+                        meter.slave, register.name, register.address, values[register.name],
+                        instrument.roundtrip_time * 1000))
+        return
+
+    if args.link:
+        if os.path.islink(args.link):
+            os.unlink(args.link)
+        os.symlink(simulator.port, args.link)
+    print(args.link or simulator.port, flush=True)
+
+    try:
+        while simulator.is_alive():
+            simulator.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.link and os.path.islink(args.link):
+            os.unlink(args.link)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# Checkpoints of the energy counters:
+#   python -m unittest test_energylog
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import energylog
+from energylog import EnergyLog
+
+def counters(imported, exported=0.0, **values):
+    return dict(values, **{'import': imported, 'export': exported, 'total': imported + exported})
+
+class EnergyLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'energy_51.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def log(self, offsets={}):
+        return EnergyLog(self.filename, 3000, offsets, interval=900, delta=0.1)
+
+    def lines(self):
+        with open(self.filename, 'rb') as file:
+            return file.readlines()
+
+    def test_offset(self):
+        values = self.log({'import': -335.8}).update(1000.0, counters(1000.0, power=50.0))
+        self.assertAlmostEqual(values['import'], 664.2)
+        self.assertAlmostEqual(values['export'], 0.0)
+        self.assertEqual(values['power'], 50.0)
+        self.assertEqual(len(self.lines()), 1)
+
+    def test_batched_writes(self):
+        log = self.log()
+        log.update(1000.0, counters(1000.0))
+        # Neither a small change nor an interval without change is written
+        log.update(1100.0, counters(1000.05))
+        log.update(3000.0, counters(1000.05))
+        self.assertEqual(len(self.lines()), 1)
+        log.update(3010.0, counters(1000.15))
+        self.assertEqual(len(self.lines()), 2)
+
+    def test_missing_counter(self):
+        log = self.log()
+        values = log.update(1000.0, {'import': 1000.0, 'export': 0.0, 'total': None, 'power': 50.0})
+        self.assertEqual(values, {'power': 50.0})
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_counter_reset(self):
+        self.log().update(1000.0, counters(1000.0))
+
+        # After a restart, the meter counts from 0 again
+        log = self.log()
+        with self.assertLogs(level='WARNING'):
+            values = log.update(2000.0, counters(2.0))
+        self.assertAlmostEqual(values['import'], 1000.0)
+        self.assertEqual(len(self.lines()), 2)
+        self.assertAlmostEqual(log.update(2010.0, counters(2.01))['import'], 1000.01)
+
+        # The offset is in the log
+        self.assertAlmostEqual(self.log().update(2020.0, counters(2.01))['import'], 1000.01)
+
+    def test_replaced_meter(self):
+        log = self.log()
+        log.update(1000.0, counters(1000.0))
+
+        # Another meter with a higher counter: more than 3 kW during 10 s
+        with self.assertLogs(level='WARNING'):
+            values = log.update(1010.0, counters(5000.0))
+        self.assertAlmostEqual(values['import'], 1000.0)
+
+        # Within max_power the counter continues as it is
+        self.assertAlmostEqual(log.update(2210.0, counters(5001.0))['import'], 1001.0)
+
+    def test_torn_line(self):
+        log = self.log()
+        log.update(1000.0, counters(1000.0))
+        with open(self.filename, 'ab') as file:
+            file.write(self.lines()[0][:20])
+
+        with self.assertLogs(level='WARNING'):
+            log = self.log()
+        with self.assertLogs(level='WARNING'):
+            self.assertAlmostEqual(log.update(2000.0, counters(2.0))['import'], 1000.0)
+
+        # The next checkpoint starts on a new line, only the torn one is skipped
+        lines = self.lines()
+        self.assertEqual(len(lines), 3)
+        self.assertIsNone(EnergyLog._parse(lines[1]))
+        self.assertIsNotNone(EnergyLog._parse(lines[2]))
+        with self.assertLogs(level='WARNING') as logs:
+            log = self.log()
+        self.assertEqual(len(logs.records), 1)
+        self.assertAlmostEqual(log.update(2010.0, counters(2.0))['import'], 1000.0)
+
+    def test_compaction(self):
+        log = self.log()
+        with mock.patch.object(energylog, 'MAX_SIZE', 10000):
+            for n in range(200):
+                log.update(1000.0 + 1000 * n, counters(1000.0 + n))
+        lines = self.lines()
+        self.assertLess(len(lines), 200)
+        self.assertLessEqual(os.path.getsize(self.filename), 10000)
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+        self.assertEqual(EnergyLog._parse(lines[-1])[1]['import'], 1199.0)
+        self.assertAlmostEqual(self.log().update(300000.0, counters(0.0))['import'], 1199.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+# Runs main() of the driver against simulated meters, with stand-ins for D-Bus, GLib and pyserial,
+# so the start up and the publishing of the first samples can be checked without a Venus device:
+#   python -m unittest test_sdm120pv
+
+import os
+import sys
+import tty
+import time
+import types
+import fcntl
+import select
+import struct
+import termios
+import tempfile
+import threading
+import unittest
+import configparser
+from unittest import mock
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'ext'))
+
+class FakeSerial(object):
+    # The part of serial.Serial that minimalmodbus and the transport use, on a raw tty
+    def __init__(self, port=None, baudrate=9600, parity='N', bytesize=8, stopbits=1, timeout=None, write_timeout=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.parity = parity
+        self.bytesize = bytesize
+        self.stopbits = stopbits
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self._fd = None
+        if port is not None:
+            self.open()
+
+    @property
+    def is_open(self):
+        return self._fd is not None
+
+    def open(self):
+        self._fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self._fd)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def fileno(self):
+        return self._fd
+
+    @property
+    def in_waiting(self):
+        return struct.unpack('I', fcntl.ioctl(self._fd, termios.FIONREAD, bytes(4)))[0]
+
+    def reset_input_buffer(self):
+        termios.tcflush(self._fd, termios.TCIFLUSH)
+
+    def reset_output_buffer(self):
+        termios.tcflush(self._fd, termios.TCOFLUSH)
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        return os.write(self._fd, data)
+
+    def read(self, size=1):
+        data = bytearray()
+        deadline = time.monotonic() + (self.timeout or 0)
+        while len(data) < size:
+            readable, _, _ = select.select([self._fd], [], [], max(deadline - time.monotonic(), 0))
+            if not readable:
+                break
+            data += os.read(self._fd, size - len(data))
+        return bytes(data)
+
+class FakeGLib(object):
+    # Main loop with the idle and timeout sources of GLib, run() returns after quit() or after
+    # duration (in s)
+    def __init__(self, duration):
+        self.duration = duration
+        self._lock = threading.Lock()
+        self._sources = []
+
+    def idle_add(self, callback, *args):
+        return self.timeout_add(0, callback, *args)
+
+    def timeout_add(self, interval, callback, *args):
+        with self._lock:
+            self._sources.append([time.monotonic() + interval / 1000.0, interval, callback, args])
+        return True
+
+    def MainLoop(self):
+        glib = self
+        class MainLoop(object):
+            def __init__(self):
+                self._running = False
+            def run(self):
+                self._running = True
+                deadline = time.monotonic() + glib.duration
+                while self._running and time.monotonic() < deadline:
+                    glib.iteration()
+                    time.sleep(0.005)
+            def quit(self):
+                self._running = False
+        return MainLoop()
+
+    def iteration(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [source for source in self._sources if source[0] <= now]
+        for source in due:
+            when, interval, callback, args = source
+            again = callback(*args)
+            with self._lock:
+                if again and interval > 0:
+                    source[0] = when + interval / 1000.0
+                else:
+                    self._sources.remove(source)
+
+class FakeDbusService(object):
+    # The part of VeDbusService that the driver uses, values are kept in a dict
+    services = []
+
+    def __init__(self, servicename, bus=None):
+        self.servicename = servicename
+        self.dbusconn = bus
+        self.values = {}
+        self.textformats = {}
+        FakeDbusService.services.append(self)
+
+    def add_path(self, path, value, description="", writeable=False, onchangecallback=None,
+            gettextcallback=None, valuetype=None):
+        self.values[path] = value
+        self.textformats[path] = gettextcallback
+
+    def __getitem__(self, path):
+        return self.values[path]
+
+    def __setitem__(self, path, value):
+        self.values[path] = value
+
+    def __contains__(self, path):
+        return path in self.values
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+def _dbus_type(name, base):
+    # A D-Bus type as a subclass of the Python type, with its variant level
+    if base in (list, dict):
+        def __init__(self, value=(), signature=None, variant_level=0):
+            base.__init__(self, value)
+            self.variant_level = variant_level
+        return type(name, (base,), {'__init__': __init__})
+
+    def __new__(cls, value=base(), signature=None, variant_level=0):
+        self = base.__new__(cls, value)
+        self.variant_level = variant_level
+        return self
+    return type(name, (base,), {'__new__': __new__})
+
+class FakeDbusObject(object):
+    # Exported object, the signals it emits are collected in emitted
+    emitted = []
+
+    def __init__(self, conn=None, object_path=None, bus_name=None):
+        self._locations = [(conn, object_path, None)] if object_path is not None else []
+        self.__dbus_object_path__ = object_path
+
+    def remove_from_connection(self):
+        self._locations = []
+
+def _dbus_signal(interface, signature=None):
+    def decorator(function):
+        def emit(self, *args):
+            function(self, *args)
+            FakeDbusObject.emitted.append((self.__dbus_object_path__, function.__name__) + args)
+        return emit
+    return decorator
+
+def fake_dbus():
+    # D-Bus as far as the driver and vedbus use it, nothing is exported
+    dbus = types.ModuleType('dbus')
+    for name, base in (
+            ('Double', float), ('Boolean', int), ('Byte', int), ('Int16', int), ('UInt16', int),
+            ('Int32', int), ('UInt32', int), ('Int64', int), ('UInt64', int), ('String', str),
+            ('Signature', str), ('ObjectPath', str), ('ByteArray', bytes), ('Array', list),
+            ('Dictionary', dict)):
+        setattr(dbus, name, _dbus_type(name, base))
+    dbus.exceptions = types.ModuleType('dbus.exceptions')
+    dbus.exceptions.DBusException = type('DBusException', (Exception,), {})
+    dbus.bus = types.ModuleType('dbus.bus')
+    dbus.bus.BusConnection = type('BusConnection', (object,), {
+        'TYPE_SYSTEM': 1, 'TYPE_SESSION': 0, '__new__': lambda cls, *args: object.__new__(cls)})
+    dbus.service = types.ModuleType('dbus.service')
+    dbus.service.Object = FakeDbusObject
+    dbus.service.BusName = type('BusName', (object,), {
+        '__init__': lambda self, *args, **kwargs: None, '__del__': lambda self: None})
+    dbus.service.method = lambda *args, **kwargs: (lambda function: function)
+    dbus.service.signal = _dbus_signal
+    dbus.mainloop = types.ModuleType('dbus.mainloop')
+    dbus.mainloop.glib = types.ModuleType('dbus.mainloop.glib')
+    dbus.mainloop.glib.DBusGMainLoop = lambda set_as_default=False: None
+    return {
+        'dbus': dbus, 'dbus.exceptions': dbus.exceptions, 'dbus.bus': dbus.bus, 'dbus.service': dbus.service,
+        'dbus.mainloop': dbus.mainloop, 'dbus.mainloop.glib': dbus.mainloop.glib,
+    }
+
+def fake_modules(glib):
+    # D-Bus, GLib, pyserial and vedbus as far as the driver and its modules use them
+    gi = types.ModuleType('gi')
+    gi.repository = types.ModuleType('gi.repository')
+    gi.repository.GLib = glib
+
+    serial = types.ModuleType('serial')
+    serial.Serial = FakeSerial
+    serial.SerialException = type('SerialException', (IOError,), {})
+    serial.PARITY_NONE = 'N'
+    serial.STOPBITS_ONE = 1
+
+    vedbus = types.ModuleType('vedbus')
+    vedbus.VeDbusService = FakeDbusService
+
+    return dict(fake_dbus(), **{
+        'gi': gi, 'gi.repository': gi.repository, 'serial': serial, 'vedbus': vedbus,
+    })
+
+# Modules of the driver, imported again with the stand-ins in each test
+DRIVER_MODULES = ('sdm120pv', 'poller', 'transport', 'history', 'energylog', 'registermap', 'minimalmodbus', 'simulator')
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.glib = FakeGLib(0)
+        FakeDbusService.services = []
+        self.directory = tempfile.TemporaryDirectory()
+        self.modules = mock.patch.dict(sys.modules, fake_modules(self.glib))
+        self.modules.start()
+        for name in DRIVER_MODULES:
+            sys.modules.pop(name, None)
+        import simulator
+        self.simulator = simulator.Simulator(
+            [simulator.SimulatedMeter(1, 'sdm120'), simulator.SimulatedMeter(2, 'sdm630')], latency=0.005)
+        self.simulator.start()
+
+    def tearDown(self):
+        self.simulator.stop()
+        self.simulator.join(1)
+        os.close(self.simulator._master)
+        os.close(self.simulator._slave)
+        self.modules.stop()
+        self.directory.cleanup()
+
+    def config(self, meters):
+        # config.ini of the driver, on the simulator and with the energy logs in a scratch directory
+        test = self
+        class ConfigParser(configparser.ConfigParser):
+            def read(self, filenames, encoding=None):
+                result = super().read(filenames, encoding)
+                self['DEFAULT']['serial_port'] = test.simulator.port
+                self['DEFAULT']['energy_log_dir'] = test.directory.name
+                self['DEFAULT']['diagnostics_interval'] = '500'
+                for name, settings in meters.items():
+                    self[name] = settings
+                return result
+        return mock.patch.object(configparser, 'ConfigParser', ConfigParser)
+
+    def run_main(self, duration):
+        import sdm120pv
+        import poller
+        self.glib.duration = duration
+        try:
+            sdm120pv.main()
+        finally:
+            self.pollers = [thread for thread in threading.enumerate() if isinstance(thread, poller.Poller)]
+            for thread in self.pollers:
+                thread.stop()
+                thread.join(1)
+                thread._loop.close()
+                thread._serial.close()
+        return {service.values['/DeviceInstance']: service for service in FakeDbusService.services}
+
+    def test_single_meter(self):
+        with self.config({}):
+            services = self.run_main(2)
+        service = services[51]
+        self.assertEqual(service.servicename, 'com.victronenergy.pvinverter.sdm120_pv_51')
+        self.assertEqual(service.values['/Ac/Position'], 1)
+        self.assertEqual(service.textformats['/Ac/Position'](None, 1), '1')
+        self.assertIsNotNone(service.values['/Ac/Power'])
+        self.assertIsNotNone(service.values['/Ac/L1/Voltage'])
+        self.assertGreater(service.values['/UpdateIndex'], 0)
+        self.assertGreater(service.values['/Diagnostics/Requests'], 0)
+        self.assertGreater(service.values['/Diagnostics/Blocks/0x0000_76/Requests'], 0)
+        self.assertGreater(service.values['/Diagnostics/Blocks/0x0000_76/RoundTrip/Average'], 0)
+
+    def test_meters_on_one_bus(self):
+        with self.config({
+                'garage': {'device_instance': '52', 'slave_address': '2', 'device_type': 'sdm630', 'inverter_position': '0'},
+                'shed': {'device_instance': '53', 'slave_address': '3'}}), self.assertLogs(level='ERROR') as logs:
+            services = self.run_main(6)
+        self.assertEqual(services[52].values['/Ac/Position'], 0)
+        self.assertIsNotNone(services[52].values['/Ac/L3/Voltage'])
+        self.assertGreater(services[52].values['/UpdateIndex'], 0)
+
+        # Slave 3 is absent: nothing is published for it and the bus is not slowed down for it
+        self.assertIsNone(services[53].values['/Ac/Power'])
+        self.assertEqual(services[53].values['/Diagnostics/Requests'], services[53].values['/Diagnostics/Timeouts'])
+        self.assertLess(self.pollers[0].interval.interval, 1.5)
+        self.assertEqual([record.getMessage().split(':')[0] for record in logs.records], ['Slave 3 is offline'])
+
+    def test_night(self):
+        # Slave 1 produces nothing and slave 3 is absent: the bus slows down
+        self.simulator.meters[1].max_power = 0
+        with self.config({
+                'house': {'device_instance': '51', 'slave_address': '1'},
+                'shed': {'device_instance': '53', 'slave_address': '3'}}):
+            services = self.run_main(6)
+        self.assertEqual(services[51].values['/Ac/Power'], 0)
+        self.assertGreater(self.pollers[0].interval.interval, 2.4)
+
+    def test_failing_meter(self):
+        # Every response is corrupted: the first failure and nothing else is logged above debug level
+        self.simulator.crc_error = 1.0
+        with self.config({}), self.assertLogs(level='WARNING') as logs:
+            services = self.run_main(2)
+        self.assertIsNone(services[51].values['/Ac/Power'])
+        self.assertGreater(services[51].values['/Diagnostics/CrcErrors'], 1)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('CRC error', logs.records[0].getMessage())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# The exported tree of vedbus, on a stand-in for D-Bus:
+#   python -m unittest test_vedbus
+
+import sys
+import unittest
+from unittest import mock
+
+from test_sdm120pv import FakeDbusObject, fake_dbus
+
+class VeDbusServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.modules = mock.patch.dict(sys.modules, fake_dbus())
+        self.modules.start()
+        for name in ('vedbus', 've_utils'):
+            sys.modules.pop(name, None)
+        import vedbus
+
+        FakeDbusObject.emitted = []
+        self.formatted = []
+        def _w(path, value):
+            self.formatted.append(path)
+            return "%.0fW" % value
+
+        self.service = vedbus.VeDbusService('com.victronenergy.pvinverter.test', bus=object())
+        self.service.add_path('/ProductName', 'Test')
+        self.service.add_path('/Ac/Power', 100.0, gettextcallback=_w, valuetype=float)
+        self.service.add_path('/Ac/L1/Power', 100.0, gettextcallback=_w, valuetype=float)
+        self.service.add_path('/Ac/L1/Voltage', 230.0, valuetype=float)
+        self.service.add_path('/Ac/Energy/Forward', None, valuetype=float)
+        self.root = self.service._dbusnodes['/']
+
+    def tearDown(self):
+        self.modules.stop()
+
+    def rebuilt(self):
+        # GetItems as built from scratch
+        return {
+            path: {'Value': item.GetValue(), 'Text': item.GetText()}
+            for path, item in self.service._dbusobjects.items()
+        }
+
+    def test_getitems_after_changes(self):
+        self.root.GetItems()
+        with self.service as ctx:
+            ctx['/Ac/Power'] = 200.0
+            ctx['/Ac/L1/Voltage'] = None
+            ctx['/Ac/Energy/Forward'] = 1.5
+        items = self.root.GetItems()
+
+        self.assertEqual(items['/Ac/Power'], {'Value': 200.0, 'Text': '200W'})
+        self.assertEqual(items['/Ac/L1/Voltage'], {'Value': [], 'Text': '---'})
+        self.assertEqual(items['/Ac/Energy/Forward'], {'Value': 1.5, 'Text': '1.5'})
+        self.assertEqual(items, self.rebuilt())
+
+        # One ItemsChanged with the changes of the context
+        self.assertEqual(len(FakeDbusObject.emitted), 1)
+        path, signal, changes = FakeDbusObject.emitted[0]
+        self.assertEqual((path, signal), ('/', 'ItemsChanged'))
+        self.assertEqual(set(changes), {'/Ac/Power', '/Ac/L1/Voltage', '/Ac/Energy/Forward'})
+
+        # A value set outside a context changes the snapshot as well
+        self.service['/Ac/Power'] = 300.0
+        self.assertEqual(self.root.GetItems()['/Ac/Power'], {'Value': 300.0, 'Text': '300W'})
+
+    def test_getitems_after_delete(self):
+        self.root.GetItems()
+        del self.service['/Ac/L1/Power']
+        items = self.root.GetItems()
+        self.assertNotIn('/Ac/L1/Power', items)
+        self.assertEqual(items, self.rebuilt())
+
+        self.service.add_path('/Ac/L2/Power', 50.0, valuetype=float)
+        self.assertEqual(self.root.GetItems()['/Ac/L2/Power'], {'Value': 50.0, 'Text': '50.0'})
+
+    def test_tree_after_delete(self):
+        ac = self.service._dbusnodes['/Ac']
+        self.assertEqual(set(ac.GetValue()), {'Power', 'L1/Power', 'L1/Voltage', 'Energy/Forward'})
+
+        del self.service['/Ac/L1/Power']
+        self.assertEqual(set(ac.GetValue()), {'Power', 'L1/Voltage', 'Energy/Forward'})
+        self.assertEqual(set(self.service._dbusnodes['/Ac/L1'].GetValue()), {'Voltage'})
+
+        # Nodes without items below them are removed
+        del self.service['/Ac/L1/Voltage']
+        self.assertNotIn('/Ac/L1', self.service._dbusnodes)
+        self.assertEqual(ac.GetValue(), {'Power': 100.0, 'Energy/Forward': []})
+        self.assertEqual(ac.GetText(), {'Power': '100W', 'Energy/Forward': '---'})
+
+        del self.service['/Ac/Power']
+        del self.service['/Ac/Energy/Forward']
+        self.assertNotIn('/Ac', self.service._dbusnodes)
+        self.assertNotIn('/Ac/Energy', self.service._dbusnodes)
+        self.assertEqual(ac._locations, [])
+        self.assertEqual(set(self.root.GetValue()), {'ProductName'})
+
+    def test_text_cache(self):
+        # Each value is formatted once, whether read by GetText, GetItems or the signals
+        item = self.service._dbusobjects['/Ac/Power']
+        self.root.GetItems()
+        self.assertEqual(self.formatted, ['/Ac/Power', '/Ac/L1/Power'])
+        for _ in range(3):
+            self.assertEqual(item.GetText(), '100W')
+            self.root.GetItems()
+        self.assertEqual(self.formatted, ['/Ac/Power', '/Ac/L1/Power'])
+
+        self.service['/Ac/Power'] = 150.0
+        self.root.GetItems()
+        self.assertEqual(item.GetText(), '150W')
+        self.assertEqual(self.formatted, ['/Ac/Power', '/Ac/L1/Power', '/Ac/Power'])
+
+    def test_wrapper(self):
+        # The wrapper of the value type, values of other types are wrapped as they are
+        value = self.service._dbusobjects['/Ac/Power'].GetValue()
+        self.assertEqual(type(value).__name__, 'Double')
+        self.assertEqual(value.variant_level, 1)
+        self.service['/Ac/Power'] = 7
+        self.assertEqual(type(self.service._dbusobjects['/Ac/Power'].GetValue()).__name__, 'Int32')
+
+if __name__ == "__main__":
+    unittest.main()
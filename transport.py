@@ -0,0 +1,319 @@
+import os
+import struct
+import time
+import logging
+import functools
+from collections import deque
+
+import serial
+import minimalmodbus
+
+# Slave address, function code, byte count and CRC around the register data of a read response
+RESPONSE_OVERHEAD = 5
+
+# Upper bounds (in s) of the buckets of the round trip time histogram, the last bucket counts the
+# slower round trips
+ROUNDTRIP_BUCKETS = (0.010, 0.020, 0.050, 0.100, 0.200, 0.500)
+
+# The timeout for a response is learned per slave from the turnaround times (from the request
+# on the wire until the first byte of the response) of its recent responses: their 99th percentile
+# times TIMEOUT_MARGIN, at least MIN_TIMEOUT and at most the timeout of the serial port (in s)
+TURNAROUND_SAMPLES = 200
+MIN_SAMPLES = 20
+TIMEOUT_MARGIN = 1.5
+MIN_TIMEOUT = 0.02
+
+# A slave that did not answer this many requests in a row is offline, and only gets a short
+# timeout until it answers again
+OFFLINE_TIMEOUTS = 3
+
+# Once a response is arriving, it has ended when no byte arrived for this long after the time
+# its remaining bytes take (in s, at least 3.5 characters). USB serial adapters pass on the bytes
+# in chunks, up to 16 ms apart.
+MIN_GAP = 0.02
+
+class CrcError(minimalmodbus.InvalidResponseError):
+    pass
+
+class BlockStatistics(object):
+    # Round trips of the reads of one register block
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0  # timeouts included
+        self.roundtrip_time = None  # of the latest successful read, in s
+        self.roundtrip_total = 0.0
+        self.roundtrip_max = 0.0
+
+class Statistics(object):
+    # Counters of the transactions with one slave. Only the poll thread updates them, readers
+    # on other threads may see a transaction counted in some counters and not yet in others.
+    def __init__(self):
+        self.requests = 0
+        self.timeouts = 0
+        self.crc_errors = 0
+        self.errors = 0  # other failed transactions
+        self.histogram = [0] * (len(ROUNDTRIP_BUCKETS) + 1)
+        self.roundtrip_time = None  # of the latest transaction, in s
+        self.roundtrip_total = 0.0
+        self.roundtrip_max = 0.0
+        self.sleep_time = 0.0  # silent periods waited for before the requests, in s
+        self.cycle_time = None  # duration of the latest poll cycle, in s
+        self.turnarounds = deque(maxlen=TURNAROUND_SAMPLES)
+        self.timeout = None  # learned, in s
+        self.late = 0  # responses that arrived after a timeout
+        self.blocks = {}  # BlockStatistics by (start, count) of the reads
+        self._probe_timeout = MIN_TIMEOUT
+        self._failures = 0  # timeouts in a row
+
+    def record(self, transaction, error):
+        self.requests += 1
+        block = self.blocks.get((transaction.start, transaction.count))
+        if block is None:
+            block = self.blocks[(transaction.start, transaction.count)] = BlockStatistics()
+        block.requests += 1
+        if error is not None:
+            block.errors += 1
+        self._failures = self._failures + 1 if isinstance(error, minimalmodbus.NoResponseError) else 0
+        if isinstance(error, minimalmodbus.NoResponseError):
+            self.timeouts += 1
+            if self.timeout is not None and self._failures < OFFLINE_TIMEOUTS:
+                # Maybe too tight, it is learned again from the next responses
+                self.timeout *= 2
+        elif isinstance(error, CrcError):
+            self.crc_errors += 1
+        elif error is not None:
+            self.errors += 1
+
+        roundtrip_time = transaction.roundtrip_time
+        if roundtrip_time is None or error is not None:
+            return
+        block.roundtrip_time = roundtrip_time
+        block.roundtrip_total += roundtrip_time
+        block.roundtrip_max = max(block.roundtrip_max, roundtrip_time)
+        bucket = 0
+        while bucket < len(ROUNDTRIP_BUCKETS) and roundtrip_time > ROUNDTRIP_BUCKETS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+        self.roundtrip_time = roundtrip_time
+        self.roundtrip_total += roundtrip_time
+        self.roundtrip_max = max(self.roundtrip_max, roundtrip_time)
+
+        self.turnarounds.append(transaction.turnaround_time)
+        if len(self.turnarounds) >= MIN_SAMPLES and self.requests % 10 == 0:
+            turnarounds = sorted(self.turnarounds)
+            p99 = turnarounds[int(0.99 * (len(turnarounds) - 1))]
+            self.timeout = max(p99 * TIMEOUT_MARGIN, MIN_TIMEOUT)
+
+    @property
+    def offline(self):
+        return self._failures >= OFFLINE_TIMEOUTS
+
+    def deadline(self, maximum):
+        # Timeout for the next response (in s)
+        if self.offline:
+            return min(self._probe_timeout, maximum)
+        if self.timeout is not None:
+            return min(self.timeout, maximum)
+        return maximum
+
+    def widen(self):
+        # A response arrived after the timeout: the slave is slower than learned
+        self.late += 1
+        self._probe_timeout *= 2
+        if self.timeout is not None:
+            self.timeout *= 2
+
+@functools.lru_cache(maxsize=256)
+def request_frame(slave, functioncode, start, count):
+    # The poll requests repeat every cycle, so each frame and its CRC are built once
+    request = struct.pack('>BBHH', slave, functioncode, start, count)
+    return request + minimalmodbus._calculate_crc(request)
+
+class Transaction(object):
+    # Read of count input or holding registers, the callback gets (transaction, response, error)
+    # and on success the register data is at response[3:3 + 2 * count]. The outcome is counted
+    # in statistics, when given. A cancelled transaction that is not on the wire yet is not sent and
+    # its callback is not called.
+    def __init__(self, slave, functioncode, start, count, callback, statistics=None):
+        self.slave = slave
+        self.functioncode = functioncode
+        self.start = start
+        self.count = count
+        self.callback = callback
+        self.statistics = statistics
+        self.cancelled = False
+        self.request = request_frame(slave, functioncode, start, count)
+        self.response_size = RESPONSE_OVERHEAD + 2 * count
+        self.turnaround_time = None
+        self.roundtrip_time = None
+
+class RtuTransport(object):
+    # Non-blocking Modbus RTU master: one transaction at a time on the wire, the silent period
+    # is a timer and the response is collected whenever the serial port becomes readable.
+    # When a transaction completes, the next request is sent (or its silent period started)
+    # before the callback runs from the ready queue of the loop, so decoding overlaps with the
+    # next request on the wire. loop is an asyncio event loop, only call_soon, call_later,
+    # add_reader and remove_reader are used.
+    def __init__(self, serial, loop, timeout=None):
+        self._serial = serial
+        self._fd = serial.fileno()
+        self._loop = loop
+        self._timeout = timeout if timeout is not None else serial.timeout
+        self._portname = serial.port or ''
+        self._silent_period = minimalmodbus._calculate_minimum_silent_period(serial.baudrate)
+        self._character_time = 11.0 / serial.baudrate  # start, 8 data, parity or stop, and stop bit
+        self._queue = deque()
+        self._current = None
+        self._timer = None
+        self._buffer = bytearray()
+        self._write_time = None
+        self._gap = max(self._silent_period, MIN_GAP)
+        self._timed_out = None
+
+    def submit(self, transaction):
+        self._queue.append(transaction)
+        self._next()
+
+    @property
+    def busy(self):
+        return self._current is not None or len(self._queue) > 0
+
+    def _next(self):
+        while self._queue and self._queue[0].cancelled:
+            self._queue.popleft()
+        if self._current is not None or not self._queue:
+            return
+        self._current = self._queue.popleft()
+
+        # Wait for 3.5 character times since the previous frame on this port
+        wait = minimalmodbus._latest_read_times.get(self._portname, 0) + self._silent_period - time.monotonic()
+        if wait > 0:
+            if self._current.statistics is not None:
+                self._current.statistics.sleep_time += wait
+            self._timer = self._loop.call_later(wait, self._send)
+        else:
+            self._send()
+
+    def _send(self):
+        self._timer = None
+        transaction = self._current
+        if transaction.cancelled:
+            # Cancelled while waiting for the silent period
+            self._current = None
+            self._next()
+            return
+        try:
+            if self._timed_out is not None and self._serial.in_waiting:
+                self._late()
+            self._serial.reset_input_buffer()
+            self._serial.write(transaction.request)
+        except Exception as e:
+            self._finish(e)
+            return
+
+        del self._buffer[:]
+        self._write_time = time.monotonic()
+        self._loop.add_reader(self._fd, self._readable)
+
+        # The first byte of the response is due within the turnaround time of the slave after the
+        # request is on the wire, then the timer moves with the bytes that arrive
+        timeout = self._timeout
+        if transaction.statistics is not None:
+            timeout = transaction.statistics.deadline(timeout)
+        self._timer = self._loop.call_later(
+            timeout + (len(transaction.request) + 1) * self._character_time, self._expired)
+
+    def _readable(self):
+        try:
+            data = os.read(self._fd, 256)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._finish(e)
+            return
+        if not data:
+            # A hung up tty, for example an unplugged USB adapter, stays readable without data
+            self._finish(serial.SerialException("device disconnected"))
+            return
+        transaction = self._current
+        if not self._buffer:
+            transaction.turnaround_time = max(
+                time.monotonic() - self._write_time - len(transaction.request) * self._character_time, 0.0)
+        self._buffer += data
+        if len(self._buffer) >= transaction.response_size:
+            self._finish(self._check(transaction))
+        elif len(self._buffer) >= RESPONSE_OVERHEAD and self._buffer[1] & 0x80:
+            # Exception responses are short, there is nothing more to wait for
+            self._finish(self._check(transaction))
+        else:
+            # The response is arriving, so its end is known: the remaining bytes plus a gap
+            self._timer.cancel()
+            self._timer = self._loop.call_later(
+                (transaction.response_size - len(self._buffer)) * self._character_time + self._gap, self._expired)
+
+    def _expired(self):
+        self._timer = None
+        if self._buffer:
+            self._finish(minimalmodbus.InvalidResponseError(
+                "Incomplete response: {} of {} bytes".format(len(self._buffer), self._current.response_size)))
+        else:
+            self._timed_out = self._current
+            self._finish(minimalmodbus.NoResponseError("No communication with the instrument (no answer)"))
+
+    def _late(self):
+        # The response to the transaction that timed out before arrived after all
+        if self._timed_out.statistics is not None:
+            self._timed_out.statistics.widen()
+        self._timed_out = None
+
+    def _check(self, transaction):
+        response = self._buffer
+        if response[0] != transaction.slave:
+            if self._timed_out is not None and response[0] == self._timed_out.slave:
+                self._late()
+            return minimalmodbus.InvalidResponseError(
+                "Wrong slave address {} in response, expected {}".format(response[0], transaction.slave))
+        size = RESPONSE_OVERHEAD if response[1] & 0x80 else transaction.response_size
+        if len(response) != size:
+            return minimalmodbus.InvalidResponseError(
+                "Wrong response length {}, expected {}".format(len(response), size))
+        if minimalmodbus._crc16(response) != 0:
+            return CrcError("CRC error in response")
+        if response[1] & 0x80:
+            try:
+                minimalmodbus._check_response_slaveerrorcode(response)
+            except minimalmodbus.ModbusException as e:
+                return e
+        if response[1] != transaction.functioncode or response[2] != 2 * transaction.count:
+            return minimalmodbus.InvalidResponseError("Unexpected function code or byte count in response")
+        return None
+
+    def _finish(self, error):
+        transaction = self._current
+        self._loop.remove_reader(self._fd)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if transaction is not self._timed_out:
+            self._timed_out = None
+        read_time = time.monotonic()
+        minimalmodbus._latest_read_times[self._portname] = read_time
+        if self._write_time is not None:
+            transaction.roundtrip_time = read_time - self._write_time
+        self._write_time = None
+        self._current = None
+
+        if transaction.statistics is not None:
+            transaction.statistics.record(transaction, error)
+        if error is not None:
+            logging.debug("Transaction 0x%04X+%d with slave %d failed: %r" % (
+                transaction.start, transaction.count, transaction.slave, error))
+
+        # The callback gets the buffer itself, the next transaction reads into a new one
+        response = None
+        if error is None:
+            response = self._buffer
+            self._buffer = bytearray()
+        self._next()
+        self._loop.call_soon(transaction.callback, transaction, response, error)